@@ -11,7 +11,7 @@ setup(name='pip_helpers',
       author_email='christian@fobel.net',
       url='http://github.com/wheeler-microfluidics/pip_helpers.git',
       license='GPLv2',
-      install_requires=['natsort', 'pip>=6.0', 'requests'],
+      install_requires=['pip>=6.0', 'requests'],
       packages=['pip_helpers'])
 
 
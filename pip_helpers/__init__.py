@@ -1,41 +1,44 @@
 from collections import OrderedDict
-import json
 import logging
+import os
 import re
+import shutil
 import subprocess as sp
 import sys
-try:
-    import xmlrpclib
-except ImportError:
-    import xmlrpc.client as xmlrpclib
+import tempfile
+import time
 
-import natsort
-import pkg_resources
-import requests
+from . import fetch
+from . import metrics
+from . import wheels
+from .release_table import (COMPARE_PATTERN, CRE_VERSION_SPECIFIERS,
+                            VERSION_PATTERN, ReleaseTable)
 
+# N.B., `pkg_resources` and `requests` are imported within the functions
+# that use them, since importing them is slow (e.g., `pkg_resources` scans
+# every installed distribution on import) and most callers only need
+# `freeze`, `install`, etc.
 
 logger = logging.getLogger(__name__)
 
 
-COMPARE_PATTERN = r'(!=|==|>=|<=|>|<)'
 CRE_PACKAGE = re.compile(r'''
     ^(?P<name>[_a-zA-Z][\w_\-\.]+)\s*
      (?P<version_specifiers>
-      {compare_pattern}\s*[\w\._]+
+      {compare_pattern}\s*{version_pattern}
       (\s*,\s*{compare_pattern}
-       \s*[\w\._]+)*)?$'''.format(compare_pattern=COMPARE_PATTERN), re.VERBOSE)
-
-CRE_VERSION_SPECIFIERS = re.compile(r'(?P<comparator>{compare_pattern})'
-                                    r'\s*(?P<version>[\w\._]+)'
-                                    .format(compare_pattern=COMPARE_PATTERN),
-                                    re.VERBOSE)
+       \s*{version_pattern})*)?$'''.format(compare_pattern=COMPARE_PATTERN,
+                                          version_pattern=VERSION_PATTERN),
+                         re.VERBOSE)
 
 DEFAULT_SERVER_URL = 'https://pypi.python.org/pypi/{}/json'
 DEFAULT_HIDDEN_URL = 'https://pypi.python.org/pypi/'
 
 
 def get_releases(package_str, pre=False, key=None, include_hidden=False,
-                 server_url=DEFAULT_SERVER_URL, hidden_url=None):
+                 server_url=DEFAULT_SERVER_URL, hidden_url=None,
+                 timeout=fetch.DEFAULT_TIMEOUT, retries=fetch.DEFAULT_RETRIES,
+                 target=None, wheels_only=False, cache=None, use_daemon=True):
     '''
     Query Python Package Index for list of available release for specified
     package.
@@ -57,18 +60,70 @@ def get_releases(package_str, pre=False, key=None, include_hidden=False,
     hidden_url : str, optional
         URL to XMLRPC API (default=``'https://pypi.python.org/pypi/'`` for PyPI
         server URL).
+    timeout : float or tuple, optional
+        ``(connect, read)`` timeouts (in seconds) for requests to the package
+        index.
+    retries : int, optional
+        Number of times to retry requests that fail with a connection error,
+        timeout, or ``429``/``5xx`` response (see :func:`fetch.fetch_json`).
+    target : wheels.Target, optional
+        Interpreter to select release files for (default: running
+        interpreter).
+    wheels_only : bool, optional
+        Exclude releases without a wheel compatible with ``target``.
+    cache : cache.MetadataCache, optional
+        Metadata store.  If specified, package metadata is served from (or
+        added to) the store instead of being fetched on every call.  See
+        :class:`sync.MetadataSync` to keep the store current.
+    use_daemon : bool, optional
+        If ``True`` and a metadata daemon is running (see :mod:`daemon`),
+        query the daemon instead of the package index.  The tags and Python
+        version of ``target`` are sent to the daemon, so files are selected
+        for ``target`` rather than the daemon's interpreter.  Ignored if
+        ``key`` or ``cache`` is specified.
 
     Returns
     -------
-    (string, collections.OrderedDict)
+    (string, release_table.ReleaseTable)
         Package name and package release information, indexed by package
         version string and ordered by upload time (i.e., most recent release is
-        last).
+        last).  See :class:`release_table.ReleaseTable` for version queries
+        (e.g., latest release matching specifiers).
+
+        The information for each release is that of the file best suited to
+        ``target`` (see :mod:`wheels`), i.e., a compatible wheel if available,
+        otherwise the source distribution.  If no file of a release is
+        compatible with ``target``, the first file whose ``requires_python``
+        includes the target Python version is used; releases with no such
+        file are excluded.
+
+
+    Raises
+    ------
+    fetch.CircuitOpenError
+        If the package index is failing and no stale response is cached.
 
 
     .. _version specifiers:
         https://www.python.org/dev/peps/pep-0440/#version-specifiers
     '''
+    if target is None:
+        target = wheels.Target()
+    if use_daemon and key is None and cache is None:
+        from . import daemon
+
+        try:
+            return daemon.get_releases(package_str, pre=pre,
+                                       include_hidden=include_hidden,
+                                       server_url=server_url,
+                                       hidden_url=hidden_url,
+                                       timeout=timeout, retries=retries,
+                                       wheels_only=wheels_only,
+                                       tags=target.tags,
+                                       python_version=target.python_version)
+        except daemon.DaemonUnavailable:
+            pass
+
     if all([not include_hidden, hidden_url is None, server_url ==
             DEFAULT_SERVER_URL]):
         hidden_url = DEFAULT_HIDDEN_URL
@@ -81,43 +136,63 @@ def get_releases(package_str, pre=False, key=None, include_hidden=False,
                          '"foo==1.0", "foo>=1.0", etc.')
     package_request = match.groupdict()
 
-    response = requests.get(server_url.format(package_request['name']))
-    package_data = json.loads(response.text)
+    # Cache entries are keyed by index, so indexes may share a cache.
+    entry = (None if cache is None else
+             cache.get(package_request['name'], index_url=server_url))
+    updated = entry is None
+    if cache is not None:
+        # Only store fetched metadata if the cache was not synced (i.e.,
+        # possibly invalidated) while fetching.
+        serial = cache.serial
+        metrics.increment('get_releases.cache',
+                          result='miss' if entry is None else 'hit')
+    if entry is None:
+        with metrics.timer('get_releases.fetch'):
+            package_data = fetch.fetch_json(server_url
+                                            .format(package_request['name']),
+                                            timeout=timeout, retries=retries)
+        entry = {'package_data': package_data, 'public_releases': None,
+                 'hidden_url': None}
+    package_data = entry['package_data']
 
     if not include_hidden:
-        client = xmlrpclib.ServerProxy(hidden_url)
-        public_releases = set(client.package_releases(package_request['name']))
-
-    if key is None:
-        key = lambda (k, v): pkg_resources.parse_version(k)
-
-    all_releases = OrderedDict(sorted([(k, v[0]) for k, v in
-                                       package_data['releases'].iteritems()
-                                       if v and (include_hidden or k in
-                                                 public_releases)], key=key))
+        if (entry['public_releases'] is None or
+                entry.get('hidden_url') != hidden_url):
+            with metrics.timer('get_releases.xmlrpc'):
+                entry = dict(entry, public_releases=fetch.call_xmlrpc(
+                    hidden_url, 'package_releases',
+                    (package_request['name'],), timeout=timeout,
+                    retries=retries), hidden_url=hidden_url)
+            updated = True
+        public_releases = set(entry['public_releases'])
+
+    if cache is not None and updated and cache.serial == serial:
+        cache.put(package_request['name'], entry, index_url=server_url)
+
+    with metrics.timer('get_releases.select'):
+        selected = [(k, target.select(v, wheels_only=wheels_only))
+                    for k, v in package_data['releases'].iteritems()
+                    if v and (include_hidden or k in public_releases)]
+        if not wheels_only:
+            # Fall back to a file with no matching tag (e.g., a wheel for
+            # another platform), but, like `pip`, drop releases whose files
+            # all exclude the target Python version.
+            selected = [(k, v if v is not None else
+                         next((f for f in package_data['releases'][k]
+                               if target.is_python_compatible(f)), None))
+                        for k, v in selected]
+        selected = [(k, v) for k, v in selected if v is not None]
+
+    with metrics.timer('get_releases.sort'):
+        all_releases = ReleaseTable.from_items(selected, key=key)
 
     if not all_releases:
         raise KeyError('No releases found for package: {}'
                        .format(package_request['name']))
 
-    package_request = match.groupdict()
-    if package_request['version_specifiers']:
-        comparators = [m.groupdict() for m in CRE_VERSION_SPECIFIERS
-                       .finditer(package_request['version_specifiers'])]
-    else:
-        comparators = []
-
-    filter_ = lambda v: (True if not comparators
-                         else all(eval('%r %s %r' %
-                                       (natsort.natsort_key(v),
-                                        c['comparator'],
-                                        natsort.natsort_key(c['version'])))
-                                  for c in comparators))
-
-    # Define regex to check for pre-release.
-    cre_pre = re.compile(r'\.dev|\.pre')
-    releases = OrderedDict([(k, v) for k, v in all_releases.iteritems()
-                            if filter_(k) and (pre or not cre_pre.search(k))])
+    with metrics.timer('get_releases.filter'):
+        releases = all_releases.filter(package_request['version_specifiers'],
+                                       pre=pre)
     if not releases:
         raise KeyError('None of the following releases match the specifiers '
                        '"{}": {}'.format(package_request['version_specifiers'],
@@ -125,7 +200,9 @@ def get_releases(package_str, pre=False, key=None, include_hidden=False,
     return package_request['name'], releases
 
 
-def install(packages, capture_streams=True):
+def install(packages, capture_streams=True, link_store=None,
+            link_mode='auto', compile_jobs=None, transactional=False,
+            profile=False, build_jobs=None, build_cache=None):
     '''
     Install the specified list of packages from the Python Package Index.
 
@@ -136,16 +213,296 @@ def install(packages, capture_streams=True):
     capture_streams : bool, optional
         If ``True``, capture ``stdout`` and ``stderr`` output and instead print
         concise progress indicator.
+    link_store : str, optional
+        If specified, build (or download) wheels for packages and their
+        dependencies into this shared store directory, and install them by
+        linking to their unpacked contents instead of copying (see
+        :mod:`linking`).  Only options supported by ``pip wheel`` (and
+        ``-U``/``--upgrade``) may be included in ``packages``.  Installed
+        packages which satisfy the requirements are left in place.
+    link_mode : str, optional
+        Link mode used if ``link_store`` is specified (see
+        :class:`linking.Linker`).
+    compile_jobs : int, optional
+        If specified, install without compiling bytecode and then compile
+        the sources of the installed packages using a pool of
+        ``compile_jobs`` processes (see
+        :func:`bytecode.compile_distributions`).  The paths of the compiled
+        source files are available as the ``compiled`` attribute of the
+        returned output (see :class:`bytecode.CompiledOutput`).
+    transactional : bool, optional
+        If ``True``, snapshot the specified packages (i.e., requirements,
+        including those of ``-r`` requirements files) before installing and
+        restore them if the install fails (see :mod:`transaction`).  Packages
+        specified by path or URL are not snapshotted.
+    profile : bool or str, optional
+        If ``True`` or a path, profile ``pip`` and return a
+        :class:`profiling.ProfiledOutput` (see :func:`_run_command`).
+    build_jobs : int, optional
+        If specified, first build wheels for packages of the install set
+        (i.e., including dependencies) which have no wheel compatible with
+        this interpreter using ``build_jobs`` concurrent processes, and make
+        the built wheels available to ``pip`` (see :func:`build.prebuild`).
+        Packages which are already installed are not built.
+    build_cache : str, optional
+        Directory of wheels built if ``build_jobs`` is specified (default:
+        :data:`build.DEFAULT_CACHE_DIR`).
 
     Returns
     -------
     str
         Combined output to ``stdout`` and ``stderr``.
     '''
-    return _run_command('install', *packages, capture_streams=capture_streams)
+    if transactional:
+        from .transaction import transaction
+
+        names = [name_i for arguments_i, names_i in _iter_arguments(packages)
+                 for name_i in names_i]
+        with transaction(names):
+            return install(packages, capture_streams=capture_streams,
+                           link_store=link_store, link_mode=link_mode,
+                           compile_jobs=compile_jobs, profile=profile,
+                           build_jobs=build_jobs, build_cache=build_cache)
+
+    if build_jobs is not None:
+        from . import build
+
+        packages = build.prebuild(packages, jobs=build_jobs,
+                                  cache_dir=build_cache)
+
+    if link_store is not None:
+        output = _link_install(packages, link_store, link_mode,
+                               capture_streams=capture_streams,
+                               profile=profile)
+    elif compile_jobs is not None:
+        output = _run_command('install', '--no-compile', *packages,
+                              capture_streams=capture_streams,
+                              profile=profile)
+    else:
+        return _run_command('install', *packages,
+                            capture_streams=capture_streams, profile=profile)
+
+    if compile_jobs is not None:
+        from . import bytecode
+
+        installed = [package_i['package']
+                     for package_i in _installed_packages(output)]
+        compiled = bytecode.compile_distributions(installed, jobs=compile_jobs)
+        if type(output) is str:
+            output = bytecode.CompiledOutput(output, compiled)
+        else:
+            # e.g., `profiling.ProfiledOutput`.
+            output.compiled = compiled
+    return output
+
+
+def _installed_packages(output):
+    '''
+    Parameters
+    ----------
+    output : str
+        Output of ``pip install``.
+
+    Returns
+    -------
+    list
+        Packages listed as installed in output, each represented as a
+        dictionary of the form ``{'package': ..., 'version': ...}``.
+    '''
+    cre_installed = re.compile(r'(?P<package>[^\s]+)-'
+                               r'(?P<version>[^\s\-]+)(\s+|$)')
+    for line_i in reversed(output.splitlines()):
+        if line_i.startswith('Successfully installed'):
+            return [match_i.groupdict() for match_i in cre_installed
+                    .finditer(line_i[len('Successfully installed'):])]
+    return []
+
+
+def _iter_arguments(packages):
+    '''
+    Parameters
+    ----------
+    packages : list
+        ``pip install`` arguments (e.g., ``["foo[bar]>=1.0", "-r",
+        "requirements.txt", "-U"]``).
+
+    Yields
+    ------
+    (list, list)
+        Argument(s) (e.g., ``["foo[bar]>=1.0"]`` or ``["-r",
+        "requirements.txt"]``) and names of packages they request (e.g.,
+        ``["foo"]``; empty for paths, URLs and other options).
+    '''
+    import pkg_resources
+
+    from .requirements import CRE_INCLUDE, load_requirements
+
+    packages = iter(packages)
+    for package_i in packages:
+        arguments_i = [package_i]
+        if package_i in ('-r', '--requirement', '-c', '--constraint'):
+            arguments_i.append(next(packages, ''))
+        match_i = CRE_INCLUDE.match(' '.join(arguments_i))
+        if match_i:
+            names_i = []
+            if (match_i.group('short') or match_i.group('long')[0]) == 'r':
+                try:
+                    names_i = [requirement_j.name for requirement_j in
+                               load_requirements(match_i.group('path'))
+                               .values()]
+                except (IOError, ValueError):
+                    # Left for `pip` to report.
+                    logger.debug('Cannot read `%s`.', match_i.group('path'),
+                                 exc_info=True)
+        elif package_i.startswith('-'):
+            names_i = []
+        else:
+            try:
+                names_i = [pkg_resources.Requirement.parse(package_i)
+                           .project_name]
+            except ValueError:
+                # e.g., path or URL (or option value).
+                names_i = []
+        yield arguments_i, names_i
+
+
+def _unsatisfied_wheels(wheel_paths, packages, upgrade=False):
+    '''
+    Parameters
+    ----------
+    wheel_paths : list
+        Wheels for requirements (and their dependencies).
+    packages : list
+        Requirements (e.g., ``"foo>=1.0"``).
+    upgrade : bool, optional
+        If ``True``, wheels for ``packages`` are always selected (i.e., like
+        ``pip install --upgrade``).
+
+    Returns
+    -------
+    list
+        ``(wheel path, installed distribution)`` tuples for projects which
+        are not installed (distribution is ``None``), or whose installed
+        version does not satisfy the requirements on the project (i.e.,
+        ``packages`` and requirements of the wheels), like ``pip install``.
+    '''
+    import pkg_resources
+
+    from .cache import normalize_name
+    from .linking import wheel_requires
+
+    installed = dict((normalize_name(dist_i.project_name), dist_i)
+                     for dist_i in pkg_resources.WorkingSet())
+    requirements = {}
+    top_level = set()
+    for package_i in packages:
+        if package_i.startswith('-'):
+            continue
+        try:
+            requirement_i = pkg_resources.Requirement.parse(package_i)
+        except ValueError:
+            # e.g., path or URL (or option value).
+            continue
+        key_i = normalize_name(requirement_i.project_name)
+        top_level.add(key_i)
+        requirements.setdefault(key_i, []).append(requirement_i)
+    for wheel_path_i in wheel_paths:
+        for requirement_j in map(pkg_resources.Requirement.parse,
+                                 wheel_requires(wheel_path_i)):
+            marker_j = getattr(requirement_j, 'marker', None)
+            if marker_j is not None:
+                try:
+                    if not marker_j.evaluate({'extra': ''}):
+                        continue
+                except Exception:
+                    pass
+            requirements.setdefault(normalize_name(requirement_j
+                                                   .project_name),
+                                    []).append(requirement_j)
+
+    unsatisfied = []
+    for wheel_path_i in wheel_paths:
+        key_i = normalize_name(wheels.CRE_WHEEL_FILENAME
+                               .match(os.path.basename(wheel_path_i))
+                               .group('name'))
+        dist_i = installed.get(key_i)
+        if (dist_i is None or (upgrade and key_i in top_level) or
+                not all(dist_i.version in requirement_j
+                        for requirement_j in requirements.get(key_i, []))):
+            unsatisfied.append((wheel_path_i, dist_i))
+        else:
+            logger.debug('Requirement already satisfied: %s==%s',
+                         dist_i.project_name, dist_i.version)
+    return unsatisfied
+
+
+def _link_install(packages, link_store, link_mode, capture_streams=True,
+                  profile=False):
+    '''
+    Install packages by linking to wheels unpacked in ``link_store``.
 
+    Like ``pip install``, projects which are already installed are only
+    replaced if the installed version does not satisfy the requirements (or
+    if ``-U``/``--upgrade`` is specified, for ``packages``).  Installed
+    versions without ``*.dist-info`` are uninstalled using ``pip`` first.
 
-def uninstall(packages, capture_streams=True):
+    See :func:`install`.
+    '''
+    from . import linking
+    from .record import find_dist_info
+
+    upgrade = any(package_i in ('-U', '--upgrade') for package_i in packages)
+    packages = [package_i for package_i in packages
+                if package_i not in ('-U', '--upgrade')]
+    wheel_store = os.path.join(link_store, 'wheels')
+    if not os.path.isdir(wheel_store):
+        os.makedirs(wheel_store)
+    # Collect wheels for the complete set of requirements in an empty
+    # directory; wheels already in the store are found (not rebuilt) by pip.
+    temp_dir = tempfile.mkdtemp(prefix='pip_helpers-wheels-')
+    try:
+        output = _run_command('wheel', '--wheel-dir', temp_dir,
+                              '--find-links', wheel_store, *packages,
+                              capture_streams=capture_streams,
+                              profile=profile)
+        wheel_paths = []
+        for filename_i in sorted(os.listdir(temp_dir)):
+            if not filename_i.endswith('.whl'):
+                continue
+            stored_i = os.path.join(wheel_store, filename_i)
+            if not os.path.exists(stored_i):
+                shutil.move(os.path.join(temp_dir, filename_i), stored_i)
+            wheel_paths.append(stored_i)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    unsatisfied = _unsatisfied_wheels(wheel_paths, packages, upgrade=upgrade)
+    for wheel_path_i, dist_i in unsatisfied:
+        if dist_i is not None and find_dist_info(dist_i.project_name) is None:
+            # e.g., installed using `*.egg-info`; cannot be replaced by links.
+            _run_command('uninstall', '-y', dist_i.project_name,
+                         capture_streams=capture_streams)
+    wheel_paths = [wheel_path_i for wheel_path_i, dist_i in unsatisfied]
+
+    dist_infos = linking.install_wheels(wheel_paths, link_store,
+                                        mode=link_mode)
+    # Summarize like `pip install`, e.g., for parsing by `upgrade`.
+    lines = [output]
+    if dist_infos:
+        lines.append('Successfully installed ' +
+                     ' '.join(os.path.basename(d)[:-len('.dist-info')]
+                              for d in dist_infos))
+    summary = '\n'.join(lines)
+    if profile:
+        from . import profiling
+
+        summary = profiling.ProfiledOutput(summary, output.lines,
+                                           output.duration,
+                                           output.profile_path)
+    return summary
+
+
+def uninstall(packages, capture_streams=True, native=False, jobs=None):
     '''
     Uninstall the specified list of Python packages
 
@@ -157,14 +514,86 @@ def uninstall(packages, capture_streams=True):
     capture_streams : bool, optional
         If ``True``, capture ``stdout`` and ``stderr`` output and instead print
         concise progress indicator.
+    native : bool, optional
+        If ``True``, remove the files listed in the ``RECORD`` of each
+        package directly (using a pool of ``jobs`` threads), instead of
+        running ``pip uninstall``.  Packages which cannot be removed safely
+        this way (e.g., installed using ``*.egg-info``, or with files outside
+        of the environment) are uninstalled using ``pip``.
+    jobs : int, optional
+        Number of threads used to remove files if ``native`` is ``True``
+        (see :func:`record.remove_files`).
 
     Returns
     -------
     str
         Combined output to ``stdout`` and ``stderr``.
+
+    Raises
+    ------
+    RuntimeError
+        If ``pip`` fails or, if ``native`` is ``True``, any file could not be
+        removed.  The message names each partially uninstalled package and
+        its remaining files.  All other packages are uninstalled first.
     '''
-    return _run_command('uninstall', *(['-y'] + list(packages)),
-                        capture_streams=capture_streams)
+    if not native:
+        return _run_command('uninstall', *(['-y'] + list(packages)),
+                            capture_streams=capture_streams)
+
+    from . import record
+
+    # Files must be within the environment, and scheme directories (e.g.,
+    # `bin`) are never removed.
+    roots = list(record.install_scheme().values()) + [sys.prefix]
+    # Files of each package to remove, keyed by distribution (e.g.,
+    # `foo-1.0`).
+    files = OrderedDict()
+    fallback = []
+    for package_i in packages:
+        dist_info_i = record.find_dist_info(package_i)
+        if dist_info_i is None:
+            fallback.append(package_i)
+            continue
+        try:
+            paths_i = record.distribution_files(dist_info_i, roots)
+        except (IOError, ValueError):
+            logger.debug('Cannot uninstall `%s` natively.', package_i,
+                         exc_info=True)
+            fallback.append(package_i)
+            continue
+        files[os.path.basename(dist_info_i)[:-len('.dist-info')]] = paths_i
+
+    with metrics.timer('uninstall.native'):
+        errors = dict(record.remove_files([path_j for paths_i in
+                                           files.values()
+                                           for path_j in paths_i], roots,
+                                          jobs=jobs))
+    # Uninstall remaining packages even if some files could not be removed.
+    lines = []
+    fallback_error = None
+    if fallback:
+        try:
+            lines.append(_run_command('uninstall', *(['-y'] + fallback),
+                                      capture_streams=capture_streams))
+        except RuntimeError as exception:
+            fallback_error = exception
+
+    partial = [(dist_i, [(path_j, errors[path_j]) for path_j in paths_i
+                         if path_j in errors])
+               for dist_i, paths_i in files.items()]
+    partial = [(dist_i, errors_i) for dist_i, errors_i in partial if errors_i]
+    lines.extend('Successfully uninstalled {}'.format(dist_i)
+                 for dist_i in files if dist_i not in dict(partial))
+    if partial or fallback_error is not None:
+        messages = ['Partially uninstalled {} (could not remove {})'
+                    .format(dist_i, ', '.join('`{}`: {}'.format(*error_j)
+                                              for error_j in errors_i))
+                    for dist_i, errors_i in partial]
+        if fallback_error is not None:
+            messages.append('`pip uninstall` of {} failed: {}'
+                            .format(', '.join(fallback), fallback_error))
+        raise RuntimeError('\n'.join(lines + messages))
+    return '\n'.join(lines)
 
 
 def freeze():
@@ -180,7 +609,7 @@ def freeze():
                    if v and not v.startswith('#')])
 
 
-def upgrade(package_name):
+def upgrade(package_name, transactional=False):
     '''
     Upgrade package, without upgrading dependencies that are already satisfied.
 
@@ -192,6 +621,10 @@ def upgrade(package_name):
     ----------
     package_name : str
         Package name.
+    transactional : bool, optional
+        If ``True``, snapshot the package before upgrading and restore it
+        (and remove any new dependencies) if the upgrade fails (see
+        :mod:`transaction`).
 
     Returns
     -------
@@ -209,6 +642,14 @@ def upgrade(package_name):
     pkg_resources.DistributionNotFound
         If package not installed.
     '''
+    import pkg_resources
+
+    if transactional:
+        from .transaction import transaction
+
+        with transaction([package_name]):
+            return upgrade(package_name)
+
     # `pkg_resources.DistributionNotFound` raised if package not installed.
     version = pkg_resources.get_distribution(package_name).version
 
@@ -260,27 +701,69 @@ def _run_command(*args, **kwargs):
         concise progress indicator.  (default=``False``)
     ostream : file-like, optional
         Write ``stdout`` and ``stderr`` to ``ostream``.
+    profile : bool or str, optional
+        If ``True`` or a path, run ``pip`` under :mod:`cProfile` (writing the
+        profile to the specified path, or to a temporary file) and timestamp
+        each output line (see :mod:`profiling`).
 
     Returns
     -------
-    str
-        Combined output to ``stdout`` and ``stderr``.
+    str or profiling.ProfiledOutput
+        Combined output to ``stdout`` and ``stderr``.  If ``profile`` is
+        set, a :class:`profiling.ProfiledOutput` (i.e., ``str`` with per-phase
+        timings and profile path attached).
+
+    Raises
+    ------
+    RuntimeError
+        If ``pip`` exits with a non-zero code.  The output (i.e., a
+        :class:`profiling.ProfiledOutput` if ``profile`` is set) is available
+        as the ``output`` attribute of the exception.
     '''
     capture_streams = kwargs.pop('capture_streams', False)
     ostream = kwargs.pop('ostream', sys.stdout)
+    profile = kwargs.pop('profile', False)
 
     # Install required packages using `pip`, with Wheeler Lab wheels server
     # for binary wheels not available on `PyPi`.
-    process_args = (sys.executable, '-m', 'pip') + args
-    process = sp.Popen(process_args, stdout=sp.PIPE, stderr=sp.STDOUT)
+    env = None
+    if profile:
+        from . import profiling
+
+        if profile is True:
+            fd, profile = tempfile.mkstemp(prefix='pip_helpers-',
+                                           suffix='.prof')
+            os.close(fd)
+        process_args = (sys.executable, '-c', profiling.BOOTSTRAP,
+                        profile) + args
+        # Flush each output line immediately, for accurate timestamps.
+        env = dict(os.environ, PYTHONUNBUFFERED='1')
+    else:
+        process_args = (sys.executable, '-m', 'pip') + args
+    command = args[0] if args else ''
+    start = time.time()
+    with metrics.timer('run_command.spawn', command=command):
+        process = sp.Popen(process_args, stdout=sp.PIPE, stderr=sp.STDOUT,
+                           env=env)
     lines = []
-    for stdout_i in iter(process.stdout.readline, b''):
-        if capture_streams:
-            ostream.write('.')
-        lines.append(stdout_i)
-    process.wait()
+    timestamps = []
+    with metrics.timer('run_command.run', command=command):
+        for stdout_i in iter(process.stdout.readline, b''):
+            timestamps.append(time.time() - start)
+            if capture_streams:
+                ostream.write('.')
+            lines.append(stdout_i)
+        process.wait()
+    duration = time.time() - start
+    metrics.increment('run_command.exit_code', command=command,
+                      exit_code=process.returncode)
     print >> ostream, ''
     output = '\n'.join(lines)
+    if profile:
+        output = profiling.ProfiledOutput(output, zip(timestamps, lines),
+                                          duration, profile)
     if process.returncode != 0:
-        raise RuntimeError(output)
+        exception = RuntimeError(output)
+        exception.output = output
+        raise exception
     return output
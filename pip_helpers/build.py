@@ -0,0 +1,250 @@
+'''
+Build wheels for source-only packages in parallel before installing.
+
+``pip install`` builds the source distributions of an install set one after
+another.  :func:`prebuild` instead:
+
+ 1. skips requested packages which are already installed (and satisfy
+    their requirement);
+ 2. downloads the install set of the other packages (i.e., including their
+    dependencies) using ``pip download``, which selects a compatible wheel
+    for each package where available, and the source distribution
+    otherwise;
+ 3. builds wheels from the downloaded source distributions concurrently,
+    each in its own ``pip wheel`` process; and
+ 4. caches each built wheel by the hash of its source distribution, so it
+    is never rebuilt.
+
+The returned ``pip`` arguments add the directories of the built wheels as
+``--find-links`` locations, so ``pip install`` still resolves the packages
+as usual (e.g., leaving installed packages which satisfy the requirements in
+place), but installs a built wheel instead of building the same source
+distribution (see the ``build_jobs`` argument of
+:func:`pip_helpers.install`).
+'''
+import errno
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+
+from . import metrics
+from .cache import normalize_name
+
+
+logger = logging.getLogger(__name__)
+
+#: Default directory of cached wheels.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                                 'pip_helpers', 'built-wheels')
+#: Pattern of source distribution filenames.
+CRE_SDIST_FILENAME = re.compile(r'^(?P<name>.+)-(?P<version>[^-]+)'
+                                r'\.(tar\.gz|tar\.bz2|tar\.xz|tgz|zip)$')
+#: ``pip install`` options to upgrade packages (not accepted by ``pip
+#: download``).
+UPGRADE_OPTIONS = ('-U', '--upgrade')
+
+
+def source_hash(path):
+    '''
+    Returns
+    -------
+    str
+        Hash identifying source distribution file (i.e., SHA256 digest of
+        its contents).
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as input_:
+        for chunk in iter(lambda: input_.read(1 << 16), b''):
+            digest.update(chunk)
+    return 'sha256-{}'.format(digest.hexdigest())
+
+
+def _is_satisfied(descriptor, working_set):
+    import pkg_resources
+
+    try:
+        working_set.require(descriptor)
+    except (pkg_resources.ResolutionError, ValueError):
+        return False
+    return True
+
+
+def find_sdist_only(packages, download_dir):
+    '''
+    Download install set of packages using ``pip download``.
+
+    Parameters
+    ----------
+    packages : list
+        Requirements (e.g., ``"foo", "foo[bar]>=1.0"``) and ``-r``
+        requirements files, optionally including ``pip download`` options
+        (and ``-U``/``--upgrade``).
+    download_dir : str
+        Directory to download the install set to.
+
+    Returns
+    -------
+    list
+        ``(name, version, path)`` tuples, one for each source distribution
+        in the install set (i.e., for each package with no wheel compatible
+        with the running interpreter).  Requested packages which are already
+        installed and satisfy their requirement are skipped, as are installed
+        dependencies (which ``pip install`` leaves in place unless upgrading
+        or their installed version does not satisfy the requirement), unless
+        ``-U``/``--upgrade`` is specified.
+    '''
+    import pkg_resources
+
+    from . import _iter_arguments, _run_command
+
+    upgrade = any(package_i in UPGRADE_OPTIONS for package_i in packages)
+    working_set = pkg_resources.WorkingSet()
+    requested = set()
+    arguments = []
+    for arguments_i, names_i in _iter_arguments(packages):
+        if arguments_i[0] in UPGRADE_OPTIONS:
+            continue
+        if (names_i and len(arguments_i) == 1 and not upgrade and
+                _is_satisfied(arguments_i[0], working_set)):
+            continue
+        requested.update(map(normalize_name, names_i))
+        arguments += arguments_i
+    if not requested:
+        return []
+
+    try:
+        with metrics.timer('build.plan'):
+            _run_command('download', '--dest', download_dir, *arguments)
+    except RuntimeError:
+        # Leave packages for `pip install` to handle (e.g., not on index).
+        logger.debug('Cannot plan build of `%s`.', arguments, exc_info=True)
+        return []
+
+    installed = set(normalize_name(dist_i.project_name)
+                    for dist_i in working_set)
+    sdist_only = []
+    for filename_i in sorted(os.listdir(download_dir)):
+        match_i = CRE_SDIST_FILENAME.match(filename_i)
+        if not match_i:
+            continue
+        name_i = normalize_name(match_i.group('name'))
+        if not upgrade and name_i not in requested and name_i in installed:
+            continue
+        sdist_only.append((match_i.group('name'), match_i.group('version'),
+                           os.path.join(download_dir, filename_i)))
+    return sdist_only
+
+
+def _build(name, version, sdist_path, cache_dir):
+    '''
+    Build wheel from source distribution (if not cached).
+
+    Returns
+    -------
+    str
+        Path to built wheel.
+    '''
+    from . import _run_command
+
+    wheel_dir = os.path.join(cache_dir, source_hash(sdist_path))
+    wheels = (sorted(f for f in os.listdir(wheel_dir) if f.endswith('.whl'))
+              if os.path.isdir(wheel_dir) else [])
+    if wheels:
+        metrics.increment('build.cache', result='hit')
+        return os.path.join(wheel_dir, wheels[0])
+    metrics.increment('build.cache', result='miss')
+
+    # Build into temporary directory and rename, so concurrent builds never
+    # see a partially written wheel.
+    temp_dir = tempfile.mkdtemp(prefix='.build-', dir=cache_dir)
+    try:
+        logger.info('Building wheel for %s==%s', name, version)
+        with metrics.timer('build.build'):
+            _run_command('wheel', '--no-deps', '--wheel-dir', temp_dir,
+                         sdist_path)
+        os.chmod(temp_dir, 0o755)
+        try:
+            os.rename(temp_dir, wheel_dir)
+        except OSError:
+            if not os.path.isdir(wheel_dir):
+                raise
+            # Built concurrently by another process.
+            shutil.rmtree(temp_dir)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    wheels = sorted(f for f in os.listdir(wheel_dir) if f.endswith('.whl'))
+    return os.path.join(wheel_dir, wheels[0])
+
+
+def prebuild(packages, jobs=None, cache_dir=None):
+    '''
+    Build wheels for source-only packages concurrently.
+
+    Parameters
+    ----------
+    packages : list
+        Package descriptors and ``pip install`` options (see
+        :func:`find_sdist_only`).
+    jobs : int, optional
+        Number of concurrent builds (default: number of CPUs).
+    cache_dir : str, optional
+        Directory of cached wheels (default: :data:`DEFAULT_CACHE_DIR`).
+        Wheels are cached separately for each interpreter (i.e., in a
+        subdirectory named after its most specific compatibility tag).
+
+    Returns
+    -------
+    list
+        ``packages``, followed by a ``--find-links`` option for the
+        directory of each built wheel.
+
+    Raises
+    ------
+    RuntimeError
+        If a build fails.
+    '''
+    from multiprocessing.pool import ThreadPool
+
+    from .wheels import supported_tags
+
+    if cache_dir is None:
+        cache_dir = DEFAULT_CACHE_DIR
+    # Wheels built for one interpreter may not be compatible with another
+    # (e.g., `cp27` extension modules).
+    cache_dir = os.path.join(cache_dir, '-'.join(supported_tags()[0]))
+    try:
+        os.makedirs(cache_dir)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST:
+            raise
+
+    download_dir = tempfile.mkdtemp(prefix='pip_helpers-download-')
+    try:
+        sdist_only = find_sdist_only(packages, download_dir)
+        if not sdist_only:
+            return list(packages)
+        if jobs is None:
+            jobs = multiprocessing.cpu_count()
+
+        # Each build runs in its own `pip wheel` process; threads only wait
+        # on them.
+        pool = ThreadPool(max(1, min(jobs, len(sdist_only))))
+        try:
+            results = [pool.apply_async(_build, (name_i, version_i, path_i,
+                                                 cache_dir))
+                       for name_i, version_i, path_i in sdist_only]
+            wheel_paths = [result_i.get() for result_i in results]
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+    find_links = []
+    for wheel_path_i in wheel_paths:
+        find_links += ['--find-links', os.path.dirname(wheel_path_i)]
+    return list(packages) + find_links
@@ -0,0 +1,168 @@
+'''
+Compile installed Python sources to bytecode in parallel.
+
+See the ``compile_jobs`` argument of :func:`pip_helpers.install`.
+'''
+import logging
+import multiprocessing
+import os
+import py_compile
+import sys
+
+from . import metrics
+from .record import find_dist_info, read_record, write_record
+
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledOutput(str):
+    '''
+    Output of ``pip install`` followed by compilation of the installed
+    packages (see the ``compile_jobs`` argument of
+    :func:`pip_helpers.install`).
+
+    Attributes
+    ----------
+    compiled : list
+        Paths of successfully compiled source files.
+    '''
+    def __new__(cls, output, compiled):
+        self = str.__new__(cls, output)
+        self.compiled = compiled
+        return self
+
+
+def cache_path(source):
+    '''
+    Returns
+    -------
+    str
+        Path of bytecode file for ``source`` (e.g., ``foo.pyc`` on Python 2,
+        ``__pycache__/foo.cpython-36.pyc`` on Python 3).
+    '''
+    if sys.version_info[0] < 3:
+        return source + ('c' if __debug__ else 'o')
+    import importlib.util
+
+    return importlib.util.cache_from_source(source)
+
+
+def _compile(source):
+    # Module-level function, so it may be pickled for `multiprocessing`.
+    try:
+        py_compile.compile(source, doraise=True)
+    except (py_compile.PyCompileError, IOError, OSError) as exception:
+        return source, str(exception)
+    return source, None
+
+
+def compile_files(sources, jobs=None):
+    '''
+    Compile Python source files using a pool of processes.
+
+    Files which fail to compile (e.g., Python 3 only modules included in a
+    package for Python 2) are logged and skipped.
+
+    Parameters
+    ----------
+    sources : list
+        Paths of Python source files.
+    jobs : int, optional
+        Number of processes (default: number of CPUs).
+
+    Returns
+    -------
+    list
+        Paths of successfully compiled source files.
+    '''
+    sources = list(sources)
+    if not sources:
+        return []
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = max(1, min(jobs, len(sources)))
+
+    with metrics.timer('bytecode.compile'):
+        if jobs == 1:
+            results = [_compile(source_i) for source_i in sources]
+        else:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                results = pool.map(_compile, sources,
+                                   chunksize=max(1, len(sources) //
+                                                 (4 * jobs)))
+            finally:
+                pool.close()
+                pool.join()
+
+    compiled = []
+    for source_i, error_i in results:
+        if error_i is None:
+            compiled.append(source_i)
+        else:
+            logger.debug('Could not compile `%s`: %s', source_i, error_i)
+    metrics.increment('bytecode.files', len(compiled))
+    return compiled
+
+
+def compile_distributions(names, site_packages_dir=None, jobs=None):
+    '''
+    Compile Python sources of installed distributions.
+
+    Sources are taken from the ``RECORD`` of each distribution, and the
+    compiled bytecode files are added to the ``RECORD``, so they are removed
+    on uninstall.  Distributions without a ``RECORD`` (e.g., installed using
+    ``*.egg-info``) are skipped.
+
+    Parameters
+    ----------
+    names : list
+        Package names.
+    site_packages_dir : str or list, optional
+        ``site-packages`` directory, or list of directories, of environment
+        (default: ``purelib`` and ``platlib`` directories of the running
+        interpreter).
+    jobs : int, optional
+        Number of processes (default: number of CPUs).
+
+    Returns
+    -------
+    list
+        Paths of successfully compiled source files.
+    '''
+    records = {}
+    for name_i in names:
+        dist_info_i = find_dist_info(name_i, site_packages_dir)
+        if dist_info_i is None:
+            logger.debug('Not compiling `%s` (no `.dist-info`).', name_i)
+            continue
+        records[dist_info_i] = read_record(dist_info_i)
+
+    sources = {}
+    for dist_info_i, rows_i in records.items():
+        root_i = os.path.dirname(os.path.abspath(dist_info_i))
+        for path_j, hash_j, size_j in rows_i:
+            if path_j.endswith('.py'):
+                sources[os.path.normpath(os.path.join(root_i, path_j))] = \
+                    dist_info_i
+
+    compiled = compile_files(sorted(sources), jobs=jobs)
+
+    added = dict((dist_info_i, []) for dist_info_i in records)
+    for source_i in compiled:
+        added[sources[source_i]].append(cache_path(source_i))
+    for dist_info_i, paths_i in added.items():
+        if not paths_i:
+            continue
+        root_i = os.path.dirname(os.path.abspath(dist_info_i))
+        listed_i = set(row[0] for row in records[dist_info_i])
+        rows_i = list(records[dist_info_i])
+        rows_i.extend((relpath_j, '', '') for relpath_j in
+                      (os.path.relpath(path_k, root_i).replace(os.sep, '/')
+                       for path_k in paths_i)
+                      if relpath_j not in listed_i)
+        write_record(dist_info_i, rows_i)
+    logger.info('Compiled %d file(s) in %d distribution(s).', len(compiled),
+                len(records))
+    return compiled
@@ -0,0 +1,102 @@
+'''
+In-memory store of package index metadata, as used by
+:func:`pip_helpers.get_releases`.
+
+Entries are served as-is, without revalidation against the package index.
+Use :class:`pip_helpers.sync.MetadataSync` to invalidate exactly the entries
+of packages which changed on the index.
+'''
+import re
+import threading
+import time
+
+
+CRE_NAME_SEPARATORS = re.compile(r'[-_.]+')
+
+
+def normalize_name(name):
+    '''
+    Returns
+    -------
+    str
+        Normalized package name (see `PEP 503`_), e.g., ``"foo-bar"`` for
+        ``"Foo_Bar"``.
+
+
+    .. _PEP 503: https://www.python.org/dev/peps/pep-0503/#normalized-names
+    '''
+    return CRE_NAME_SEPARATORS.sub('-', name).lower()
+
+
+class MetadataCache(object):
+    '''
+    Thread-safe in-memory metadata store.
+
+    Entries are keyed by package name and index URL (i.e., the JSON API URL
+    the metadata was fetched from), so indexes may share a cache.  Each entry
+    is a dictionary containing:
+     - :data:`package_data`: Package metadata from the JSON API.
+     - :data:`public_releases`: List of public (i.e., not hidden) release
+       versions, or ``None`` if not known.
+     - :data:`hidden_url`: URL of XML-RPC API ``public_releases`` were
+       fetched from (optional).
+
+    Parameters
+    ----------
+    ttl : float, optional
+        Seconds after which entries expire (default: never, e.g., if kept
+        current by :class:`pip_helpers.sync.MetadataSync`).
+
+    Attributes
+    ----------
+    serial : int or None
+        Index changelog serial the entries are current to (see
+        :class:`pip_helpers.sync.MetadataSync`).
+    '''
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Mapping from normalized name to `(entry, time stored)` tuples,
+        # keyed by index URL.
+        self._entries = {}
+        self.serial = None
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries_i) for entries_i in self._entries.values())
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._entries
+
+    def get(self, name, index_url=None):
+        '''
+        Returns
+        -------
+        dict or None
+            Entry for package from index, or ``None`` if not cached.
+        '''
+        with self._lock:
+            entries = self._entries.get(normalize_name(name), {})
+            entry, stored = entries.get(index_url, (None, None))
+            if (entry is not None and self.ttl is not None and
+                    time.time() - stored > self.ttl):
+                del entries[index_url]
+                return None
+            return entry
+
+    def put(self, name, entry, index_url=None):
+        with self._lock:
+            self._entries.setdefault(normalize_name(name), {})[index_url] = \
+                (entry, time.time())
+
+    def invalidate(self, names):
+        '''
+        Discard entries (from every index) for the specified package names.
+        '''
+        with self._lock:
+            for name_i in names:
+                self._entries.pop(normalize_name(name_i), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
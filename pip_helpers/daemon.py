@@ -0,0 +1,375 @@
+'''
+Local daemon serving :func:`pip_helpers.get_releases` to many processes.
+
+The daemon owns the connection pools, metadata cache (optionally kept
+current by :class:`pip_helpers.sync.MetadataSync`) and parsed release tables,
+so cache hits are shared by every process on the host.  While the daemon is
+running, :func:`pip_helpers.get_releases` transparently forwards requests to
+it (falling back to querying the package index directly if the daemon cannot
+be reached).
+
+Protocol
+--------
+Clients connect to a Unix domain socket and send requests, one JSON object
+per line, of the form::
+
+    {"method": "get_releases", "args": ["foo>=1.0"],
+     "kwargs": {"pre": true, "tags": [["cp27", "cp27mu", "manylinux1_x86_64"],
+                                      ...], "python_version": "2.7.18"}}
+
+Release files are selected for the interpreter described by the ``tags`` and
+``python_version`` of the client (default: the daemon's interpreter).
+
+Each request is answered by one JSON line, either::
+
+    {"result": {"name": "foo", "releases": [["1.0", {...}], ...]}}
+
+or::
+
+    {"error": {"type": "KeyError", "message": "..."}}
+
+Cached metadata expires after ``--ttl`` seconds (default:
+:data:`DEFAULT_TTL`), and is additionally invalidated as soon as packages
+change on the index if ``--sync-interval`` is given.
+
+Example usage:
+
+.. code-block:: sh
+
+    python -m pip_helpers.daemon \\
+        --store ~/.cache/pip_helpers/releases.sqlite --sync-interval 60
+'''
+from collections import OrderedDict
+import errno
+import json
+import logging
+import os
+import socket
+import threading
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+from . import fetch
+from . import metrics
+from .cache import MetadataCache, normalize_name
+from .fetch import CircuitOpenError
+
+
+logger = logging.getLogger(__name__)
+
+#: Environment variable overriding :data:`DEFAULT_SOCKET_PATH`.
+SOCKET_PATH_ENV = 'PIP_HELPERS_DAEMON_SOCKET'
+#: Default path of daemon socket.
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser('~'), '.cache',
+                                   'pip_helpers', 'daemon.sock')
+#: Default client socket timeout (in seconds).
+DEFAULT_TIMEOUT = 60.
+#: Default time (in seconds) after which cached metadata expires.
+DEFAULT_TTL = 300.
+#: Maximum number of parsed results kept by the daemon.
+MAX_RESULTS = 1024
+#: Keyword arguments of :func:`pip_helpers.get_releases` which may be
+#: forwarded to the daemon (i.e., which are JSON serializable).
+FORWARDED_KWARGS = ('pre', 'include_hidden', 'server_url', 'hidden_url',
+                    'timeout', 'retries', 'wheels_only')
+# Errors raised by the daemon which are raised as the same type by clients.
+# Requests failing with other errors are retried locally by clients (see
+# `DaemonUnavailable`), so errors do not depend on whether a daemon is
+# running.
+ERROR_TYPES = dict((error_i.__name__, error_i)
+                   for error_i in (KeyError, ValueError, CircuitOpenError))
+
+
+class DaemonUnavailable(RuntimeError):
+    '''
+    Raised by :func:`request` if the daemon cannot be reached, or the
+    request failed with an error which cannot be raised as the same type by
+    the client (see :data:`ERROR_TYPES`).
+    '''
+    pass
+
+
+def socket_path():
+    '''
+    Returns
+    -------
+    str
+        Path of daemon socket (see :data:`SOCKET_PATH_ENV`).
+    '''
+    return os.environ.get(SOCKET_PATH_ENV, DEFAULT_SOCKET_PATH)
+
+
+def request(method, args=(), kwargs=None, path=None,
+            timeout=DEFAULT_TIMEOUT):
+    '''
+    Send request to daemon and return result.
+
+    Raises
+    ------
+    DaemonUnavailable
+        If daemon cannot be reached, or request failed with an error other
+        than those in :data:`ERROR_TYPES`.
+    '''
+    if path is None:
+        path = socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        raise DaemonUnavailable('No daemon socket at `{}`'.format(path))
+    message = json.dumps({'method': method, 'args': list(args),
+                          'kwargs': kwargs or {}}) + '\n'
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+        client.sendall(message.encode('utf-8'))
+        stream = client.makefile('rb')
+        try:
+            line = stream.readline()
+        finally:
+            stream.close()
+    except socket.error as exception:
+        # Includes timeouts and daemon exiting mid-request (e.g., `EPIPE`).
+        raise DaemonUnavailable('Request to `{}` failed: {}'
+                                .format(path, exception))
+    finally:
+        client.close()
+    if not line:
+        raise DaemonUnavailable('No response from `{}`'.format(path))
+    response = json.loads(line.decode('utf-8'))
+    if 'error' in response:
+        error_type = ERROR_TYPES.get(response['error']['type'])
+        if error_type is None:
+            raise DaemonUnavailable('Request to `{}` failed: {}: {}'
+                                    .format(path, response['error']['type'],
+                                            response['error']['message']))
+        raise error_type(response['error']['message'])
+    return response['result']
+
+
+def request_timeout(timeout=fetch.DEFAULT_TIMEOUT,
+                    retries=fetch.DEFAULT_RETRIES):
+    '''
+    Returns
+    -------
+    float
+        Client socket timeout (in seconds) covering the longest time the
+        daemon may take to answer a :func:`pip_helpers.get_releases`
+        request, i.e., a JSON API and an XML-RPC request, each retried
+        ``retries`` times with maximum backoff (see :mod:`fetch`).
+    '''
+    if isinstance(timeout, (tuple, list)):
+        attempt = sum(timeout)
+    else:
+        attempt = 2 * timeout
+    per_request = ((retries + 1) * attempt + retries *
+                   fetch.DEFAULT_MAX_BACKOFF)
+    return max(DEFAULT_TIMEOUT, 2 * per_request + DEFAULT_TIMEOUT)
+
+
+def get_releases(package_str, path=None, **kwargs):
+    '''
+    Query daemon for releases (see :func:`pip_helpers.get_releases`).
+
+    Raises
+    ------
+    DaemonUnavailable
+        If daemon cannot be reached, or does not answer within
+        :func:`request_timeout`.
+    '''
+    from .release_table import ReleaseTable
+
+    timeout = request_timeout(kwargs.get('timeout', fetch.DEFAULT_TIMEOUT),
+                              kwargs.get('retries', fetch.DEFAULT_RETRIES))
+    with metrics.timer('daemon.request'):
+        result = request('get_releases', (package_str, ), kwargs, path=path,
+                         timeout=timeout)
+    return result['name'], ReleaseTable(result['releases'])
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in iter(self.rfile.readline, b''):
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line.decode('utf-8'))
+                method = getattr(self.server, 'do_' + message['method'])
+                response = {'result': method(*message.get('args', []),
+                                             **message.get('kwargs', {}))}
+            except Exception as exception:
+                if not isinstance(exception, tuple(ERROR_TYPES.values())):
+                    logger.debug('Request failed: %r', line, exc_info=True)
+                response = {'error': {'type': type(exception).__name__,
+                                      'message': (exception.args[0]
+                                                  if len(exception.args) == 1
+                                                  else str(exception))}}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class MetadataServer(socketserver.UnixStreamServer):
+    '''
+    Daemon serving :func:`pip_helpers.get_releases` over a Unix socket.
+
+    Requests are handled by a fixed pool of threads, so connection pools
+    (see :mod:`pip_helpers.fetch`) are reused across requests.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of socket (default: :func:`socket_path`).
+    cache : cache.MetadataCache, optional
+        Metadata store (e.g., :class:`pip_helpers.store.ReleaseStore`;
+        default: new in-memory cache expiring entries after
+        :data:`DEFAULT_TTL` seconds).
+    threads : int, optional
+        Number of request handler threads.
+    '''
+    def __init__(self, path=None, cache=None, threads=8):
+        from multiprocessing.pool import ThreadPool
+
+        if path is None:
+            path = socket_path()
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if os.path.exists(path):
+            try:
+                request('ping', path=path, timeout=1)
+            except DaemonUnavailable:
+                # Stale socket left behind by a daemon which exited.
+                os.remove(path)
+            else:
+                raise RuntimeError('Daemon already running at `{}`'
+                                   .format(path))
+        self.cache = MetadataCache(DEFAULT_TTL) if cache is None else cache
+        self._pool = ThreadPool(threads)
+        # Parsed results, least recently used first.
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+        # Targets requested by clients, keyed by `(tags, python_version)`.
+        self._targets = {}
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+    def process_request(self, request_, client_address):
+        self._pool.apply_async(self._process_request, (request_,
+                                                       client_address))
+
+    def _process_request(self, request_, client_address):
+        try:
+            self.finish_request(request_, client_address)
+        except Exception:
+            self.handle_error(request_, client_address)
+        finally:
+            self.shutdown_request(request_)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self._pool.close()
+        try:
+            os.remove(self.server_address)
+        except OSError as exception:
+            if exception.errno != errno.ENOENT:
+                raise
+
+    def do_ping(self):
+        return 'pong'
+
+    def _target(self, tags, python_version):
+        from .wheels import Target
+
+        target_key = (None if tags is None else
+                      tuple(tuple(tag_i) for tag_i in tags), python_version)
+        with self._results_lock:
+            if target_key not in self._targets:
+                self._targets[target_key] = (len(self._targets),
+                                             Target(tags, python_version))
+            return self._targets[target_key]
+
+    def do_get_releases(self, package_str, tags=None, python_version=None,
+                        **kwargs):
+        from . import CRE_PACKAGE, DEFAULT_SERVER_URL, get_releases
+
+        unknown = set(kwargs) - set(FORWARDED_KWARGS)
+        if unknown:
+            raise ValueError('Unsupported arguments: {}'
+                             .format(', '.join(sorted(unknown))))
+        if isinstance(kwargs.get('timeout'), list):
+            kwargs['timeout'] = tuple(kwargs['timeout'])
+        target_id, target = self._target(tags, python_version)
+        match = CRE_PACKAGE.match(package_str)
+        name = normalize_name(match.group('name')) if match else None
+        key = json.dumps([package_str, kwargs, target_id], sort_keys=True)
+        index_url = kwargs.get('server_url', DEFAULT_SERVER_URL)
+
+        # Reuse parsed result while the cache entry it was computed from is
+        # current (i.e., has not been invalidated and refetched).  Only
+        # possible for in-memory caches, which return the same entry object.
+        memoize = isinstance(self.cache, MetadataCache)
+        entry = (self.cache.get(name, index_url=index_url)
+                 if memoize and name else None)
+        with self._results_lock:
+            cached = self._results.pop(key, None)
+            if cached is not None:
+                self._results[key] = cached
+        if cached is not None and entry is not None and cached[0] is entry:
+            metrics.increment('daemon.results', result='hit')
+            return cached[1]
+        metrics.increment('daemon.results', result='miss')
+
+        name, releases = get_releases(package_str, cache=self.cache,
+                                      target=target, use_daemon=False,
+                                      **kwargs)
+        result = {'name': name, 'releases': list(releases.items())}
+        if memoize:
+            with self._results_lock:
+                self._results.pop(key, None)
+                self._results[key] = (self.cache.get(name,
+                                                     index_url=index_url),
+                                      result)
+                while len(self._results) > MAX_RESULTS:
+                    self._results.popitem(last=False)
+        return result
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve package metadata to '
+                                     'local `pip_helpers` clients.')
+    parser.add_argument('--socket', default=socket_path(),
+                        help='Socket path (default: %(default)s)')
+    parser.add_argument('--store', help='Path to SQLite metadata store '
+                        '(default: in-memory cache)')
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL,
+                        help='Expire cached metadata after TTL seconds; 0 to '
+                        'never expire (default: %(default)s)')
+    parser.add_argument('--sync-interval', type=float, help='Invalidate '
+                        'changed packages every SYNC_INTERVAL seconds')
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.store:
+        from .store import ReleaseStore
+
+        cache = ReleaseStore(args.store, ttl=args.ttl or None)
+    else:
+        cache = MetadataCache(ttl=args.ttl or None)
+    server = MetadataServer(args.socket, cache=cache, threads=args.threads)
+    if args.sync_interval:
+        from .sync import MetadataSync
+
+        MetadataSync(server.cache).start(args.sync_interval)
+    logger.info('Serving on `%s`', args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
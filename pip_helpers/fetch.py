@@ -0,0 +1,412 @@
+'''
+Resilient access to package index APIs.
+
+Requests are made with connect/read timeouts and retried on connection
+errors, timeouts and ``429``/``5xx`` responses using jittered exponential
+backoff (honouring any ``Retry-After`` header).  Failures are tracked by a
+per-host :class:`CircuitBreaker`; while a host's circuit is open, requests to
+it fail fast with :class:`CircuitOpenError`, or are served the last good
+response for the same request (i.e., URL, or XML-RPC method call) when one
+is available.
+'''
+from collections import OrderedDict
+import email.utils
+import logging
+import random
+import socket
+import threading
+import time
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+#: Default ``(connect, read)`` timeouts (in seconds).
+DEFAULT_TIMEOUT = (3.05, 30)
+#: Default number of retries after the first attempt.
+DEFAULT_RETRIES = 3
+#: Base delay (in seconds) for exponential backoff.
+DEFAULT_BACKOFF_FACTOR = 0.5
+#: Upper bound (in seconds) on delay between attempts.
+DEFAULT_MAX_BACKOFF = 30.
+#: HTTP status codes which are retried.
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+#: Maximum number of last good responses kept for serving stale.
+MAX_STALE_RESPONSES = 256
+
+
+class CircuitOpenError(RuntimeError):
+    '''
+    Raised when a request is refused because the host's circuit is open.
+    '''
+    pass
+
+
+class _Retry(Exception):
+    '''
+    Raised by request functions to signal a retryable failure.
+    '''
+    def __init__(self, error, retry_after=None):
+        super(_Retry, self).__init__(error)
+        self.error = error
+        self.retry_after = retry_after
+
+
+class CircuitBreaker(object):
+    '''
+    Circuit breaker tracking consecutive failures for a single host.
+
+    After ``failure_threshold`` consecutive failures the circuit *opens* and
+    :meth:`allow` returns ``False`` for ``reset_timeout`` seconds.  The
+    circuit is then *half-open*: a single trial request is allowed, which
+    closes the circuit on success or re-opens it on failure.
+
+    Parameters
+    ----------
+    failure_threshold : int, optional
+        Number of consecutive failures before the circuit opens.
+    reset_timeout : float, optional
+        Seconds to wait before allowing a trial request.
+    '''
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        elif time.time() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        '''
+        Returns
+        -------
+        bool
+            ``True`` if a request may be attempted.
+        '''
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            elif state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (self._trial_in_progress or
+                    self._failures >= self.failure_threshold):
+                self._opened_at = time.time()
+            self._trial_in_progress = False
+
+    def release(self):
+        '''
+        End trial request (if any) without recording its outcome.
+        '''
+        with self._lock:
+            self._trial_in_progress = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+# Last good response for each URL (or `(url, method, args)` XML-RPC call),
+# least recently stored first.
+_stale = OrderedDict()
+_stale_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_breaker(url):
+    '''
+    Returns
+    -------
+    CircuitBreaker
+        Circuit breaker shared by all requests to the host of ``url``.
+    '''
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+def _session():
+    '''
+    Returns
+    -------
+    requests.Session
+        Session (i.e., connection pool) for the calling thread.
+    '''
+    import requests
+
+    if getattr(_local, 'session', None) is None:
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _parse_retry_after(value):
+    '''
+    Returns
+    -------
+    float or None
+        Delay (in seconds) specified by ``Retry-After`` header value, which
+        is either a number of seconds or an HTTP date.
+    '''
+    if not value:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_tz(value)
+        if parsed is None:
+            return None
+        return max(0., email.utils.mktime_tz(parsed) - time.time())
+
+
+def _backoff(attempt, backoff_factor, max_backoff):
+    # "Full jitter": uniformly distributed up to the exponential bound.
+    return random.uniform(0, min(max_backoff,
+                                 backoff_factor * 2 ** attempt))
+
+
+def _call(url, func, retries, backoff_factor, max_backoff):
+    '''
+    Call ``func`` until it succeeds, retrying when it raises :class:`_Retry`.
+    '''
+    host = urlsplit(url).netloc
+    breaker = get_breaker(url)
+    error = None
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            metrics.increment('fetch.circuit_open', host=host)
+            raise CircuitOpenError('Circuit open for host `{}`; last error: '
+                                   '{}'.format(host, error))
+        try:
+            result = func()
+        except _Retry as exception:
+            breaker.record_failure()
+            error = exception.error
+            if attempt >= retries:
+                break
+            delay = exception.retry_after
+            if delay is None:
+                delay = _backoff(attempt, backoff_factor, max_backoff)
+            delay = min(delay, max_backoff)
+            logger.debug('Attempt %d for `%s` failed (%s); retrying in '
+                         '%.2fs.', attempt + 1, url, error, delay)
+            metrics.increment('fetch.retries', host=host)
+            time.sleep(delay)
+        except Exception:
+            # Not a retryable failure (e.g., `404` response), so the host is
+            # reachable.
+            breaker.record_success()
+            raise
+        except BaseException:
+            # e.g., `KeyboardInterrupt`; allow another trial request.
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+    raise error
+
+
+def _store_stale(key, data):
+    with _stale_lock:
+        _stale.pop(key, None)
+        _stale[key] = data
+        while len(_stale) > MAX_STALE_RESPONSES:
+            _stale.popitem(last=False)
+
+
+def _get_stale(key, url):
+    '''
+    Returns
+    -------
+    object or None
+        Last good response for request ``key`` (logged as served), or
+        ``None`` if not available.
+    '''
+    with _stale_lock:
+        stale = _stale.get(key)
+    if stale is not None:
+        logger.warning('Request for `%s` failed; serving stale response.',
+                       url, exc_info=True)
+        metrics.increment('fetch.stale', host=urlsplit(url).netloc)
+    return stale
+
+
+def fetch_json(url, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+               backoff_factor=DEFAULT_BACKOFF_FACTOR,
+               max_backoff=DEFAULT_MAX_BACKOFF, serve_stale=True):
+    '''
+    Fetch and decode JSON document.
+
+    Parameters
+    ----------
+    url : str
+        URL of JSON document.
+    timeout : float or tuple, optional
+        ``(connect, read)`` timeouts, or single timeout for both (in seconds).
+    retries : int, optional
+        Number of retries after the first attempt.
+    backoff_factor : float, optional
+        Base delay (in seconds) for jittered exponential backoff.
+    max_backoff : float, optional
+        Upper bound (in seconds) on delay between attempts.
+    serve_stale : bool, optional
+        If ``True``, return the last good response for ``url`` (if any)
+        instead of raising an error when the request fails with a retryable
+        error (see :data:`RETRY_STATUS_CODES`) or the host's circuit is open.
+        The last :data:`MAX_STALE_RESPONSES` good responses are kept.
+
+    Returns
+    -------
+    object
+        Decoded JSON document.
+
+    Raises
+    ------
+    CircuitOpenError
+        If the host's circuit is open and no stale response is available.
+    requests.RequestException
+        If the request failed and no stale response is available.
+    '''
+    import requests
+
+    host = urlsplit(url).netloc
+
+    def _get():
+        try:
+            response = _session().get(url, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as exception:
+            raise _Retry(exception)
+        if response.status_code in RETRY_STATUS_CODES:
+            raise _Retry(requests.HTTPError('{} error for url: {}'
+                                            .format(response.status_code,
+                                                    url), response=response),
+                         _parse_retry_after(response.headers
+                                            .get('Retry-After')))
+        # Other errors (e.g., `404` for unknown package) are not retried and
+        # do not count against the host's circuit.
+        response.raise_for_status()
+        return response
+
+    try:
+        response = _call(url, _get, retries, backoff_factor, max_backoff)
+    except (CircuitOpenError, requests.RequestException) as exception:
+        # Only serve stale response if the index is failing, not if it
+        # answered (e.g., `404` for a removed package).
+        status_code = getattr(getattr(exception, 'response', None),
+                              'status_code', None)
+        retryable = (isinstance(exception, (CircuitOpenError,
+                                            requests.ConnectionError,
+                                            requests.Timeout)) or
+                     status_code in RETRY_STATUS_CODES)
+        stale = _get_stale(url, url) if serve_stale and retryable else None
+        if stale is not None:
+            return stale
+        raise
+    metrics.increment('fetch.bytes', len(response.content), host=host)
+    data = response.json()
+    _store_stale(url, data)
+    return data
+
+
+def call_xmlrpc(url, method, args=(), timeout=DEFAULT_TIMEOUT,
+                retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                max_backoff=DEFAULT_MAX_BACKOFF, serve_stale=True):
+    '''
+    Call XML-RPC method with timeout, retries and circuit breaker.
+
+    Parameters
+    ----------
+    url : str
+        URL of XML-RPC API.
+    method : str
+        Name of method to call (e.g., ``"package_releases"``).
+    args : tuple, optional
+        Positional arguments for method.
+    timeout : float or tuple, optional
+        Socket timeout (in seconds).  If a ``(connect, read)`` tuple is
+        given, the larger value is used.
+    serve_stale : bool, optional
+        If ``True``, return the last good result of the same call (if any)
+        instead of raising an error when the call fails with a retryable
+        error or the host's circuit is open.
+
+    See :func:`fetch_json` for other parameters.
+    '''
+    try:
+        import xmlrpclib
+    except ImportError:
+        import xmlrpc.client as xmlrpclib
+
+    if isinstance(timeout, (tuple, list)):
+        timeout = max(timeout)
+
+    def _rpc():
+        transport_type = (xmlrpclib.SafeTransport if url.startswith('https')
+                          else xmlrpclib.Transport)
+
+        class _TimeoutTransport(transport_type):
+            def make_connection(self, host):
+                connection = transport_type.make_connection(self, host)
+                connection.timeout = timeout
+                return connection
+
+        client = xmlrpclib.ServerProxy(url, transport=_TimeoutTransport())
+        try:
+            return getattr(client, method)(*args)
+        except xmlrpclib.ProtocolError as exception:
+            if exception.errcode in RETRY_STATUS_CODES:
+                raise _Retry(exception, _parse_retry_after(
+                    exception.headers.get('Retry-After')
+                    if exception.headers else None))
+            raise
+        except (socket.error, socket.timeout) as exception:
+            raise _Retry(exception)
+
+    key = (url, method, tuple(args))
+    try:
+        result = _call(url, _rpc, retries, backoff_factor, max_backoff)
+    except (CircuitOpenError, xmlrpclib.ProtocolError,
+            socket.error) as exception:
+        # Only serve stale result if the index is failing (see
+        # `fetch_json`).
+        retryable = (not isinstance(exception, xmlrpclib.ProtocolError) or
+                     exception.errcode in RETRY_STATUS_CODES)
+        stale = _get_stale(key, url) if serve_stale and retryable else None
+        if stale is not None:
+            return stale
+        raise
+    _store_stale(key, result)
+    return result
@@ -0,0 +1,451 @@
+'''
+Install wheels into many environments without copying their contents.
+
+Each wheel is unpacked *once* into a shared store directory.  Installing the
+wheel into an environment then populates the environment with links to the
+unpacked files, using (in order of preference):
+
+ 1. reflinks (i.e., copy-on-write clones, on file systems which support them,
+    e.g., Btrfs or XFS on Linux);
+ 2. hard links;
+ 3. copies (e.g., if the store is on a different file system).
+
+A ``RECORD`` file listing the installed files (along with an ``INSTALLER``
+file) is written for each installed distribution, so that ``pip uninstall``
+and ``pip freeze`` (and :func:`pip_helpers.uninstall` and
+:func:`pip_helpers.freeze`) work as usual.
+
+.. warning::
+    Hard links share contents with the store and with every other
+    environment linked to it, so installed files must not be modified in
+    place.
+
+Example usage:
+
+.. code-block:: python
+
+    >>> import pip_helpers as ph
+    >>>
+    >>> # Install into environment of running interpreter.
+    >>> ph.install(['numpy'], link_store='/var/cache/wheel-store')
+    >>> # Install wheel into another environment (same Python version).
+    >>> from pip_helpers.linking import install_wheel
+    >>> install_wheel('numpy-1.11.1-cp27-cp27mu-manylinux1_x86_64.whl',
+    ...               '/var/cache/wheel-store', prefix='/opt/envs/foo')
+'''
+try:
+    from ConfigParser import RawConfigParser
+except ImportError:
+    from configparser import RawConfigParser
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+from . import metrics
+from .record import (distribution_files, file_hash, find_dist_info,
+                     find_egg_info, install_scheme, read_record, remove_files,
+                     write_record)
+
+
+logger = logging.getLogger(__name__)
+
+#: Name written to ``INSTALLER`` file of distributions installed by links.
+INSTALLER = 'pip_helpers'
+# `FICLONE` ioctl request code (Linux); clones contents of a file.
+FICLONE = 0x40049409
+
+SCRIPT_TEMPLATE = '''#!{python}
+# -*- coding: utf-8 -*-
+import re
+import sys
+
+from {module} import {import_name}
+
+if __name__ == '__main__':
+    sys.argv[0] = re.sub(r'(-script\\.pyw?|\\.exe)?$', '', sys.argv[0])
+    sys.exit({function}())
+'''
+
+
+def _reflink(source, destination):
+    import fcntl
+
+    with open(source, 'rb') as input_:
+        with open(destination, 'wb') as output:
+            fcntl.ioctl(output.fileno(), FICLONE, input_.fileno())
+    shutil.copystat(source, destination)
+
+
+class Linker(object):
+    '''
+    Link files using the best method supported by the file system.
+
+    Methods found not to be supported are not tried again by the same
+    linker.
+
+    Parameters
+    ----------
+    mode : str, optional
+        One of ``"auto"`` (try reflink, then hard link, then copy),
+        ``"reflink"``, ``"hardlink"`` or ``"copy"``.
+    '''
+    MODES = ('reflink', 'hardlink', 'copy')
+
+    def __init__(self, mode='auto'):
+        if mode == 'auto':
+            self.modes = list(self.MODES)
+            if not hasattr(os, 'link'):
+                self.modes.remove('hardlink')
+            if not sys.platform.startswith('linux'):
+                self.modes.remove('reflink')
+        elif mode in self.MODES:
+            self.modes = [mode]
+        else:
+            raise ValueError('Invalid link mode: `{}`'.format(mode))
+
+    def link(self, source, destination):
+        '''
+        Returns
+        -------
+        str
+            Method used to link ``source`` to ``destination``.
+        '''
+        for mode_i in list(self.modes):
+            try:
+                if mode_i == 'reflink':
+                    _reflink(source, destination)
+                elif mode_i == 'hardlink':
+                    os.link(source, destination)
+                else:
+                    shutil.copy2(source, destination)
+            except (IOError, OSError) as exception:
+                if mode_i == 'copy' or len(self.modes) == 1:
+                    raise
+                if os.path.lexists(destination):
+                    os.remove(destination)
+                logger.debug('Cannot %s `%s` (%s); falling back.', mode_i,
+                             destination, exception)
+                self.modes.remove(mode_i)
+            else:
+                metrics.increment('linking.files', mode=mode_i)
+                return mode_i
+
+
+def unpack_wheel(wheel_path, store_dir):
+    '''
+    Unpack wheel into store (if not already unpacked).
+
+    Parameters
+    ----------
+    wheel_path : str
+        Path to wheel file.
+    store_dir : str
+        Store directory.
+
+    Returns
+    -------
+    str
+        Path to unpacked wheel, i.e., ``<store_dir>/unpacked/<sha256 of
+        wheel>``.
+    '''
+    digest = hashlib.sha256()
+    with open(wheel_path, 'rb') as input_:
+        for chunk in iter(lambda: input_.read(1 << 16), b''):
+            digest.update(chunk)
+    unpacked_root = os.path.join(store_dir, 'unpacked')
+    unpacked_dir = os.path.join(unpacked_root, digest.hexdigest())
+    if os.path.isdir(unpacked_dir):
+        metrics.increment('linking.unpack', result='hit')
+        return unpacked_dir
+
+    metrics.increment('linking.unpack', result='miss')
+    if not os.path.isdir(unpacked_root):
+        try:
+            os.makedirs(unpacked_root)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise
+    # Unpack to temporary directory and rename, so concurrent installs never
+    # see a partially unpacked wheel.
+    temp_dir = tempfile.mkdtemp(prefix='.unpack-', dir=unpacked_root)
+    try:
+        os.chmod(temp_dir, 0o755)
+        with zipfile.ZipFile(wheel_path) as wheel:
+            for info_i in wheel.infolist():
+                path_i = wheel.extract(info_i, temp_dir)
+                mode_i = (info_i.external_attr >> 16) & 0o777
+                if mode_i:
+                    os.chmod(path_i, mode_i)
+        try:
+            os.rename(temp_dir, unpacked_dir)
+        except OSError:
+            if not os.path.isdir(unpacked_dir):
+                raise
+            # Unpacked concurrently by another process.
+            shutil.rmtree(temp_dir)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return unpacked_dir
+
+
+def _find_unpacked_dist_info(unpacked_dir):
+    for entry_i in os.listdir(unpacked_dir):
+        if entry_i.endswith('.dist-info'):
+            return entry_i
+    raise ValueError('No `.dist-info` directory found in `{}`'
+                     .format(unpacked_dir))
+
+
+def _write_scripts(dist_info, scripts_dir, python):
+    '''
+    Write wrapper scripts for entry points of ``dist_info``.
+
+    Returns
+    -------
+    list
+        Paths of written scripts.
+    '''
+    entry_points_path = os.path.join(dist_info, 'entry_points.txt')
+    if not os.path.isfile(entry_points_path):
+        return []
+    parser = RawConfigParser()
+    parser.optionxform = str
+    parser.read(entry_points_path)
+    scripts = []
+    for section in ('console_scripts', 'gui_scripts'):
+        if not parser.has_section(section):
+            continue
+        if not os.path.isdir(scripts_dir):
+            os.makedirs(scripts_dir)
+        for name, value in parser.items(section):
+            # e.g., `module.sub:function.attr [extra]`
+            value = value.split('[')[0].strip()
+            module, _, function = value.partition(':')
+            import_name = function.split('.')[0]
+            script_path = os.path.join(scripts_dir, name)
+            if os.path.lexists(script_path):
+                os.remove(script_path)
+            with open(script_path, 'w') as output:
+                output.write(SCRIPT_TEMPLATE.format(python=python,
+                                                    module=module.strip(),
+                                                    import_name=import_name,
+                                                    function=function))
+            os.chmod(script_path, 0o755)
+            scripts.append(script_path)
+    return scripts
+
+
+def _remove_installed(dist_info, scheme, prefix):
+    '''
+    Remove files of installed distribution listed in its ``RECORD``.
+    '''
+    roots = list(scheme.values()) + [prefix]
+    errors = remove_files(distribution_files(dist_info, roots), roots)
+    if errors:
+        raise IOError('\n'.join('Could not remove `{}`: {}'.format(*error_i)
+                                for error_i in errors))
+
+
+def _install_script(source, destination, python):
+    '''
+    Copy script, rewriting ``#!python`` line to use ``python``.
+
+    Returns
+    -------
+    (str, int)
+        Hash and size of installed script.
+    '''
+    with open(source, 'rb') as input_:
+        content = input_.read()
+    if content.startswith(b'#!python'):
+        first_line, newline, rest = content.partition(b'\n')
+        content = (b'#!' + python.encode(sys.getfilesystemencoding()) +
+                   first_line[len(b'#!python'):] + newline + rest)
+    with open(destination, 'wb') as output:
+        output.write(content)
+    os.chmod(destination, 0o755)
+    return file_hash(destination), len(content)
+
+
+def wheel_requires(wheel_path):
+    '''
+    Returns
+    -------
+    list
+        ``Requires-Dist`` requirements of wheel (e.g., ``"bar (>=1.0)"``,
+        ``"baz; extra == 'qux'"``).
+    '''
+    import email.parser
+
+    with zipfile.ZipFile(wheel_path) as wheel:
+        metadata_path = next(name_i for name_i in wheel.namelist()
+                             if name_i.count('/') == 1 and
+                             name_i.endswith('.dist-info/METADATA'))
+        metadata = wheel.read(metadata_path).decode('utf-8')
+    headers = email.parser.Parser().parsestr(metadata, headersonly=True)
+    return headers.get_all('Requires-Dist') or []
+
+
+def _root_is_purelib(dist_info):
+    '''
+    Returns
+    -------
+    bool
+        ``Root-Is-Purelib`` of ``WHEEL`` metadata in ``dist_info`` directory
+        (i.e., ``False`` if the root of the wheel belongs in ``platlib``).
+    '''
+    import email.parser
+
+    with open(os.path.join(dist_info, 'WHEEL')) as input_:
+        headers = email.parser.Parser().parse(input_, headersonly=True)
+    return (headers.get('Root-Is-Purelib', 'true').strip().lower() ==
+            'true')
+
+
+def install_wheel(wheel_path, store_dir, prefix=None, mode='auto',
+                  python=None, linker=None):
+    '''
+    Install wheel into environment by linking to its unpacked contents.
+
+    Any installed version of the same project is removed first.  Versions
+    installed without ``*.dist-info`` (e.g., ``*.egg-info``) must first be
+    uninstalled using ``pip``.
+
+    Parameters
+    ----------
+    wheel_path : str
+        Path to wheel file.
+    store_dir : str
+        Store directory, shared by all environments (see
+        :func:`unpack_wheel`).
+    prefix : str, optional
+        Prefix of target environment (default: environment of the running
+        interpreter).  Must use the same Python version as the running
+        interpreter.
+    mode : str, optional
+        Link mode (see :class:`Linker`).
+    python : str, optional
+        Interpreter path written to the ``#!`` line of scripts (default:
+        ``<prefix>/bin/python``, or :data:`sys.executable` if ``prefix`` is
+        not specified).
+
+    Returns
+    -------
+    str
+        Path to ``*.dist-info`` directory of installed distribution.
+
+    Raises
+    ------
+    RuntimeError
+        If the project is installed without ``*.dist-info``.
+    '''
+    if linker is None:
+        linker = Linker(mode)
+    scheme = install_scheme(prefix)
+    if python is None:
+        python = (sys.executable if prefix is None
+                  else os.path.join(scheme['scripts'],
+                                    os.path.basename(sys.executable)))
+
+    with metrics.timer('linking.unpack'):
+        unpacked_dir = unpack_wheel(wheel_path, store_dir)
+    dist_info_name = _find_unpacked_dist_info(unpacked_dir)
+    # e.g., wheels with extension modules are installed into `platlib`
+    # (`lib64` on some distributions).
+    site_packages_dir = scheme[
+        'purelib' if _root_is_purelib(os.path.join(unpacked_dir,
+                                                   dist_info_name))
+        else 'platlib']
+    data_dir_name = dist_info_name[:-len('.dist-info')] + '.data'
+    source_hashes = dict((path, (hash_, size)) for path, hash_, size in
+                         read_record(os.path.join(unpacked_dir,
+                                                  dist_info_name)))
+
+    project_name = dist_info_name[:-len('.dist-info')].rsplit('-', 1)[0]
+    # Previous versions may be installed in either directory.
+    site_packages_dirs = [scheme['purelib'], scheme['platlib']]
+    existing = find_dist_info(project_name, site_packages_dirs)
+    egg_info = (find_egg_info(project_name, site_packages_dirs)
+                if existing is None else None)
+    if egg_info is not None:
+        # Linking over it would leave both `*.egg-info` and `*.dist-info`
+        # metadata (and orphaned files).
+        raise RuntimeError('`{}` is installed without `.dist-info` (`{}`); '
+                           'uninstall it using `pip` first.'
+                           .format(project_name, egg_info))
+    if existing is not None:
+        logger.debug('Removing existing installation: %s', existing)
+        _remove_installed(existing, scheme,
+                          sys.prefix if prefix is None else prefix)
+
+    rows = []
+    with metrics.timer('linking.link'):
+        for root, dirs, files in os.walk(unpacked_dir):
+            relroot = os.path.relpath(root, unpacked_dir)
+            for filename in files:
+                relpath = os.path.normpath(os.path.join(relroot, filename))
+                record_path = relpath.replace(os.sep, '/')
+                parts = record_path.split('/')
+                if parts[0] == dist_info_name and parts[1] in ('RECORD',
+                                                               'INSTALLER'):
+                    # Written below (never linked, since they differ for
+                    # each environment).
+                    continue
+                source = os.path.join(root, filename)
+                if parts[0] == data_dir_name:
+                    # e.g., `foo-1.0.data/scripts/bar`
+                    destination = os.path.join(scheme[parts[1]], *parts[2:])
+                else:
+                    destination = os.path.join(site_packages_dir, *parts)
+                parent = os.path.dirname(destination)
+                if not os.path.isdir(parent):
+                    os.makedirs(parent)
+                if os.path.lexists(destination):
+                    os.remove(destination)
+                hash_, size = source_hashes.get(record_path, ('', ''))
+                if parts[0] == data_dir_name and parts[1] == 'scripts':
+                    hash_, size = _install_script(source, destination,
+                                                  python)
+                else:
+                    linker.link(source, destination)
+                    if not hash_:
+                        hash_, size = (file_hash(source),
+                                       os.path.getsize(source))
+                rows.append((os.path.relpath(destination, site_packages_dir)
+                             .replace(os.sep, '/'), hash_, size))
+
+    dist_info = os.path.join(site_packages_dir, dist_info_name)
+    for script_i in _write_scripts(dist_info, scheme['scripts'], python):
+        rows.append((os.path.relpath(script_i, site_packages_dir)
+                     .replace(os.sep, '/'), file_hash(script_i),
+                     os.path.getsize(script_i)))
+    installer_path = os.path.join(dist_info, 'INSTALLER')
+    with open(installer_path, 'w') as output:
+        output.write(INSTALLER + '\n')
+    rows.append((dist_info_name + '/INSTALLER', file_hash(installer_path),
+                 os.path.getsize(installer_path)))
+    write_record(dist_info, rows)
+    logger.debug('Linked %s into %s', dist_info_name, site_packages_dir)
+    return dist_info
+
+
+def install_wheels(wheel_paths, store_dir, prefix=None, mode='auto',
+                   python=None):
+    '''
+    Install wheels into environment (see :func:`install_wheel`).
+
+    Returns
+    -------
+    list
+        Paths to ``*.dist-info`` directories of installed distributions.
+    '''
+    linker = Linker(mode)
+    return [install_wheel(wheel_path_i, store_dir, prefix=prefix,
+                          python=python, linker=linker)
+            for wheel_path_i in wheel_paths]
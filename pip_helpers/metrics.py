@@ -0,0 +1,229 @@
+'''
+Lightweight instrumentation for :mod:`pip_helpers` operations.
+
+Every operation in :mod:`pip_helpers` reports to the module-level
+:data:`REGISTRY`:
+
+ - per-phase durations (e.g., ``get_releases.fetch``,
+   ``run_command.spawn``), as ``timer`` events;
+ - counts such as bytes transferred, cache hits/misses, and subprocess exit
+   codes, as ``counter`` events.
+
+Callbacks registered with :func:`add_hook` receive each event as it is
+recorded, e.g., to forward it to an external metrics system.  Aggregated
+values may be exported with :func:`to_json` or :func:`to_prometheus`.
+
+Example usage:
+
+.. code-block:: python
+
+    >>> import pip_helpers as ph
+    >>> import pip_helpers.metrics
+    >>>
+    >>> ph.get_releases('natsort')
+    >>> print pip_helpers.metrics.to_prometheus()
+'''
+from collections import OrderedDict
+import contextlib
+import json
+import logging
+import re
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+#: Prefix prepended to metric names by :meth:`MetricsRegistry.to_prometheus`.
+PROMETHEUS_PREFIX = 'pip_helpers_'
+
+
+def _labels_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry(object):
+    '''
+    Thread-safe registry of timers and counters.
+
+    Timers are aggregated as count/sum/min/max of observed durations (in
+    seconds), so memory use does not grow with the number of observations.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hooks = []
+        self.reset()
+
+    def reset(self):
+        '''
+        Discard all recorded values (registered hooks are kept).
+        '''
+        with self._lock:
+            self._counters = OrderedDict()
+            self._timers = OrderedDict()
+
+    def add_hook(self, callback):
+        '''
+        Register callback to be called with each recorded event.
+
+        Parameters
+        ----------
+        callback : function
+            Called as ``callback(event)``, where ``event`` is a dictionary
+            with the keys ``type`` (``"timer"`` or ``"counter"``), ``name``,
+            ``value`` and ``labels``.
+        '''
+        with self._lock:
+            self._hooks.append(callback)
+
+    def remove_hook(self, callback):
+        '''
+        Unregister callback previously added with :meth:`add_hook`.
+        '''
+        with self._lock:
+            self._hooks.remove(callback)
+
+    def _notify(self, event):
+        for hook_i in list(self._hooks):
+            try:
+                hook_i(event)
+            except Exception:
+                # Instrumentation must never break the instrumented code.
+                logger.debug('Metrics hook failed: %r', hook_i, exc_info=True)
+
+    def increment(self, name, value=1, **labels):
+        '''
+        Add ``value`` to counter ``name``.
+
+        Parameters
+        ----------
+        name : str
+            Counter name (e.g., ``"fetch.bytes"``).
+        value : int or float, optional
+            Amount to add to counter.
+        **labels
+            Optional labels distinguishing series of the same counter (e.g.,
+            ``exit_code=1``).
+        '''
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._notify({'type': 'counter', 'name': name, 'value': value,
+                      'labels': dict(labels)})
+
+    def observe(self, name, seconds, **labels):
+        '''
+        Record duration (in seconds) for timer ``name``.
+        '''
+        key = (name, _labels_key(labels))
+        with self._lock:
+            summary = self._timers.get(key)
+            if summary is None:
+                summary = self._timers[key] = {'count': 0, 'sum': 0.,
+                                               'min': seconds,
+                                               'max': seconds}
+            summary['count'] += 1
+            summary['sum'] += seconds
+            summary['min'] = min(summary['min'], seconds)
+            summary['max'] = max(summary['max'], seconds)
+        self._notify({'type': 'timer', 'name': name, 'value': seconds,
+                      'labels': dict(labels)})
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        '''
+        Context manager recording duration of the enclosed block.
+
+        The duration is recorded even if the block raises an exception.
+        '''
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **labels)
+
+    def snapshot(self):
+        '''
+        Returns
+        -------
+        dict
+            Copy of recorded values, of the form ``{'counters': [...],
+            'timers': [...]}``, where each item is a dictionary containing
+            ``name`` and ``labels`` keys along with the recorded values.
+        '''
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self._counters.items()]
+            timers = [dict([('name', name), ('labels', dict(labels))] +
+                           list(summary.items()))
+                      for (name, labels), summary in self._timers.items()]
+        return {'counters': counters, 'timers': timers}
+
+    def to_json(self, **kwargs):
+        '''
+        Returns
+        -------
+        str
+            Recorded values (see :meth:`snapshot`) encoded as JSON.  Keyword
+            arguments are passed to :func:`json.dumps`.
+        '''
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        '''
+        Returns
+        -------
+        str
+            Recorded values in the Prometheus text exposition format.  Timers
+            are exported as ``<name>_seconds_{count,sum,min,max}`` and
+            counters as ``<name>_total``.
+        '''
+        def _name(name):
+            return prefix + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+        def _labels(labels):
+            if not labels:
+                return ''
+            # Backslashes, quotes and newlines must be escaped in label
+            # values.
+            return '{%s}' % ','.join('%s="%s"' % (k, str(v)
+                                                  .replace('\\', r'\\')
+                                                  .replace('"', r'\"')
+                                                  .replace('\n', r'\n'))
+                                     for k, v in sorted(labels.items()))
+
+        snapshot = self.snapshot()
+        # Group samples by metric name; each name gets one ``TYPE`` line.
+        samples = OrderedDict()
+        for counter_i in snapshot['counters']:
+            name = _name(counter_i['name']) + '_total'
+            samples.setdefault((name, 'counter'), []).append(
+                '%s%s %r' % (name, _labels(counter_i['labels']),
+                             counter_i['value']))
+        for timer_i in snapshot['timers']:
+            name = _name(timer_i['name']) + '_seconds'
+            for field in ('count', 'sum', 'min', 'max'):
+                field_name = '%s_%s' % (name, field)
+                type_ = 'counter' if field in ('count', 'sum') else 'gauge'
+                samples.setdefault((field_name, type_), []).append(
+                    '%s%s %r' % (field_name, _labels(timer_i['labels']),
+                                 timer_i[field]))
+        lines = []
+        for (name, type_), samples_i in samples.items():
+            lines.append('# TYPE %s %s' % (name, type_))
+            lines.extend(samples_i)
+        return '\n'.join(lines) + '\n'
+
+
+#: Default registry used by all :mod:`pip_helpers` operations.
+REGISTRY = MetricsRegistry()
+
+add_hook = REGISTRY.add_hook
+remove_hook = REGISTRY.remove_hook
+increment = REGISTRY.increment
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+snapshot = REGISTRY.snapshot
+reset = REGISTRY.reset
+to_json = REGISTRY.to_json
+to_prometheus = REGISTRY.to_prometheus
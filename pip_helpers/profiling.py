@@ -0,0 +1,130 @@
+'''
+Profile ``pip`` processes launched by :mod:`pip_helpers`.
+
+In profiling mode (see the ``profile`` argument of
+:func:`pip_helpers.install`), ``pip`` runs under :mod:`cProfile`, each output
+line is timestamped, and the time between output lines is attributed to the
+phase (e.g., resolution, download, build, install) indicated by the most
+recent phase line.  The result is a :class:`ProfiledOutput`, which is the
+usual output string with the timings and path to the raw profile attached.
+
+Example usage:
+
+.. code-block:: python
+
+    >>> import pstats
+    >>> import pip_helpers as ph
+    >>>
+    >>> output = ph.install(['pandas'], profile=True)
+    >>> output.phases
+    OrderedDict([('startup', 0.41), ('resolve', 1.52), ('download', 6.03),
+                 ('build', 0.0), ('install', 9.87)])
+    >>> stats = pstats.Stats(output.profile_path)
+    >>> stats.sort_stats('cumulative').print_stats(20)
+'''
+from collections import OrderedDict
+import re
+
+
+#: Phases of ``pip`` run, in order.
+PHASES = ('startup', 'resolve', 'download', 'build', 'install')
+#: Patterns of output lines marking the start of each phase.
+PHASE_PATTERNS = [('resolve', re.compile(r'^\s*(Collecting|Requirement '
+                                         r'already|Looking in|Obtaining|'
+                                         r'Processing)')),
+                  ('download', re.compile(r'^\s*(Downloading|Using cached|'
+                                          r'File was already downloaded|'
+                                          r'Saved )')),
+                  ('build', re.compile(r'^\s*(Building wheels? for|Running '
+                                       r'setup\.py|Created wheel|Stored in '
+                                       r'directory|Building wheel)')),
+                  ('install', re.compile(r'^\s*(Installing collected|'
+                                         r'Found existing installation|'
+                                         r'Attempting uninstall|Uninstalling|'
+                                         r'Successfully (un)?installed)'))]
+
+# Run `pip` under `cProfile`, preserving its exit code.
+#
+# Usage: python -c BOOTSTRAP <profile path> [pip arguments...]
+BOOTSTRAP = '''
+import cProfile
+import runpy
+import sys
+
+path = sys.argv[1]
+sys.argv = ['pip'] + sys.argv[2:]
+profile = cProfile.Profile()
+code = 0
+try:
+    profile.runcall(runpy.run_module, 'pip', run_name='__main__',
+                    alter_sys=True)
+except SystemExit as exception:
+    code = exception.code
+finally:
+    profile.dump_stats(path)
+sys.exit(code)
+'''
+
+
+class ProfiledOutput(str):
+    '''
+    Output of profiled ``pip`` run.
+
+    Attributes
+    ----------
+    lines : list
+        ``(seconds since start, line)`` tuples for each output line.
+    duration : float
+        Total run time (in seconds).
+    phases : collections.OrderedDict
+        Seconds spent in each phase (see :data:`PHASES`).
+    profile_path : str
+        Path to raw :mod:`cProfile` output (see :class:`pstats.Stats`).
+    '''
+    def __new__(cls, output, lines, duration, profile_path):
+        self = str.__new__(cls, output)
+        self.lines = lines
+        self.duration = duration
+        self.phases = phase_times(lines, duration)
+        self.profile_path = profile_path
+        return self
+
+
+def line_phase(line):
+    '''
+    Returns
+    -------
+    str or None
+        Phase marked by output line, or ``None`` if line does not mark a
+        phase.
+    '''
+    for phase_i, cre_phase_i in PHASE_PATTERNS:
+        if cre_phase_i.search(line):
+            return phase_i
+    return None
+
+
+def phase_times(lines, duration):
+    '''
+    Parameters
+    ----------
+    lines : list
+        ``(seconds since start, line)`` tuples.
+    duration : float
+        Total run time (in seconds).
+
+    Returns
+    -------
+    collections.OrderedDict
+        Seconds spent in each phase (see :data:`PHASES`).  Time before the
+        first output line is attributed to ``startup``.
+    '''
+    times = OrderedDict((phase_i, 0.) for phase_i in PHASES)
+    phase = 'startup'
+    previous = 0.
+    for timestamp_i, line_i in lines:
+        times[phase] += timestamp_i - previous
+        previous = timestamp_i
+        phase = line_phase(line_i) or phase
+    times[phase] += max(0., duration - previous)
+    return times
@@ -0,0 +1,348 @@
+'''
+Helpers for installed distribution metadata (i.e., ``*.dist-info``
+directories and their ``RECORD`` files, see `PEP 376`_).
+
+.. _PEP 376: https://www.python.org/dev/peps/pep-0376/
+'''
+import base64
+import csv
+import errno
+import hashlib
+import os
+import sys
+import sysconfig
+
+from .cache import normalize_name
+
+
+def site_packages(prefix=None):
+    '''
+    Parameters
+    ----------
+    prefix : str, optional
+        Environment prefix (default: prefix of the running interpreter).
+
+    Returns
+    -------
+    str
+        Path to ``site-packages`` directory of environment.
+    '''
+    return install_scheme(prefix)['purelib']
+
+
+def site_packages_dirs(prefix=None):
+    '''
+    Parameters
+    ----------
+    prefix : str, optional
+        Environment prefix (default: prefix of the running interpreter).
+
+    Returns
+    -------
+    list
+        Paths to ``purelib`` and ``platlib`` directories of environment
+        (a single path if they are the same, e.g., on distributions
+        without ``lib64``).
+    '''
+    scheme = install_scheme(prefix)
+    paths = [scheme['purelib']]
+    if scheme['platlib'] != scheme['purelib']:
+        paths.append(scheme['platlib'])
+    return paths
+
+
+def install_scheme(prefix=None):
+    '''
+    Parameters
+    ----------
+    prefix : str, optional
+        Environment prefix (default: prefix of the running interpreter).
+
+    Returns
+    -------
+    dict
+        Installation paths of environment, keyed by ``purelib``,
+        ``platlib``, ``scripts``, ``data`` and ``headers``.
+
+    Notes
+    -----
+    Paths are computed for the version of the running interpreter, so the
+    environment at ``prefix`` must use the same Python version.
+    '''
+    if prefix is None:
+        prefix = sys.prefix
+    paths = sysconfig.get_paths(vars={'base': prefix, 'platbase': prefix})
+    return {'purelib': paths['purelib'],
+            'platlib': paths['platlib'],
+            'scripts': paths['scripts'],
+            'data': paths['data'],
+            'headers': paths['include']}
+
+
+def file_hash(path, algorithm='sha256'):
+    '''
+    Returns
+    -------
+    str
+        Hash of file contents in ``RECORD`` format (e.g.,
+        ``"sha256=<urlsafe base64 digest>"``).
+    '''
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as input_:
+        for chunk in iter(lambda: input_.read(1 << 16), b''):
+            digest.update(chunk)
+    return '{}={}'.format(algorithm, base64.urlsafe_b64encode(digest.digest())
+                          .decode('ascii').rstrip('='))
+
+
+def _iter_entries(site_packages_dir):
+    '''
+    Yields
+    ------
+    tuple
+        Directory and name of each entry in directory, or list of
+        directories (default: :func:`site_packages_dirs`).  Missing
+        directories are skipped.
+    '''
+    if site_packages_dir is None:
+        site_packages_dir = site_packages_dirs()
+    elif isinstance(site_packages_dir, basestring):
+        site_packages_dir = [site_packages_dir]
+    for dir_i in site_packages_dir:
+        try:
+            entries_i = os.listdir(dir_i)
+        except OSError:
+            continue
+        for entry_j in entries_i:
+            yield dir_i, entry_j
+
+
+def find_dist_info(name, site_packages_dir=None):
+    '''
+    Parameters
+    ----------
+    name : str
+        Package name.
+    site_packages_dir : str or list, optional
+        Directory, or list of directories, to search (default: ``purelib``
+        and ``platlib`` directories of the running interpreter, see
+        :func:`site_packages_dirs`).
+
+    Returns
+    -------
+    str or None
+        Path to ``*.dist-info`` directory of installed package, or ``None``
+        if package is not installed as a wheel (e.g., installed using
+        ``*.egg-info``, or not installed).
+    '''
+    name = normalize_name(name)
+    for dir_i, entry_i in _iter_entries(site_packages_dir):
+        if not entry_i.endswith('.dist-info'):
+            continue
+        project_i = entry_i[:-len('.dist-info')].rsplit('-', 1)[0]
+        if normalize_name(project_i) == name:
+            return os.path.join(dir_i, entry_i)
+    return None
+
+
+def find_egg_info(name, site_packages_dir=None):
+    '''
+    Parameters
+    ----------
+    name : str
+        Package name.
+    site_packages_dir : str or list, optional
+        Directory, or list of directories, to search (default: ``purelib``
+        and ``platlib`` directories of the running interpreter, see
+        :func:`site_packages_dirs`).
+
+    Returns
+    -------
+    str or None
+        Path to ``*.egg-info``, ``*.egg`` or ``*.egg-link`` entry of package
+        installed without ``*.dist-info`` (e.g., by ``setup.py install`` or
+        ``setup.py develop``), or ``None`` if not found.
+    '''
+    name = normalize_name(name)
+    for dir_i, entry_i in _iter_entries(site_packages_dir):
+        if not entry_i.endswith(('.egg-info', '.egg', '.egg-link')):
+            continue
+        # Egg names escape `-` within project names as `_`.
+        project_i = entry_i.rsplit('.', 1)[0].split('-', 1)[0]
+        if normalize_name(project_i) == name:
+            return os.path.join(dir_i, entry_i)
+    return None
+
+
+def read_record(dist_info):
+    '''
+    Parameters
+    ----------
+    dist_info : str
+        Path to ``*.dist-info`` directory.
+
+    Returns
+    -------
+    list
+        ``(path, hash, size)`` rows of ``RECORD`` file, with paths relative
+        to the parent directory of ``dist_info`` (i.e., ``site-packages``).
+
+    Raises
+    ------
+    IOError
+        If ``RECORD`` file does not exist.
+    '''
+    with open(os.path.join(dist_info, 'RECORD'), 'rb') as input_:
+        content = input_.read()
+    if sys.version_info[0] < 3:
+        # Python 2 `csv` module does not support unicode input.
+        rows = [[v.decode('utf-8') for v in row]
+                for row in csv.reader(content.splitlines())]
+    else:
+        rows = csv.reader(content.decode('utf-8').splitlines())
+    return [tuple((list(row) + ['', ''])[:3]) for row in rows if row]
+
+
+def write_record(dist_info, rows):
+    '''
+    Write ``RECORD`` file.
+
+    The ``RECORD`` file itself is always listed, without hash or size.
+    '''
+    record_path = os.path.join(dist_info, 'RECORD')
+    record_relpath = (os.path.relpath(record_path, os.path.dirname(dist_info))
+                      .replace(os.sep, '/'))
+    rows = [row for row in rows if row[0] != record_relpath]
+    rows.append((record_relpath, '', ''))
+    if sys.version_info[0] < 3:
+        output = open(record_path, 'wb')
+        rows = [[v.encode('utf-8') if isinstance(v, unicode) else str(v)
+                 for v in row] for row in rows]
+    else:
+        output = open(record_path, 'w', newline='', encoding='utf-8')
+        rows = [[str(v) for v in row] for row in rows]
+    with output:
+        csv.writer(output, lineterminator='\n').writerows(rows)
+
+
+def record_paths(dist_info):
+    '''
+    Returns
+    -------
+    list
+        Absolute paths of files listed in ``RECORD`` of ``dist_info``.
+    '''
+    root = os.path.dirname(os.path.abspath(dist_info))
+    return [os.path.normpath(os.path.join(root, path))
+            for path, hash_, size in read_record(dist_info)]
+
+
+def _is_within(path, roots):
+    return any(path == root_i or path.startswith(root_i.rstrip(os.sep) +
+                                                 os.sep)
+               for root_i in roots)
+
+
+def distribution_files(dist_info, roots):
+    '''
+    Parameters
+    ----------
+    dist_info : str
+        Path to ``*.dist-info`` directory.
+    roots : list
+        Directories which files of the distribution may be located in (e.g.,
+        environment prefix).
+
+    Returns
+    -------
+    list
+        Absolute paths of files of distribution, i.e., listed in ``RECORD``,
+        along with bytecode files of listed Python sources and all files in
+        ``dist_info``.
+
+    Raises
+    ------
+    ValueError
+        If any listed file is not located within ``roots``.
+    '''
+    from .bytecode import cache_path
+
+    roots = [os.path.realpath(root_i) for root_i in roots]
+    paths = set()
+    for path_i in record_paths(dist_info):
+        if not _is_within(os.path.realpath(os.path.dirname(path_i)), roots):
+            raise ValueError('`{}` (listed in `{}`) is outside of `{}`.'
+                             .format(path_i, dist_info, roots))
+        paths.add(path_i)
+        if path_i.endswith('.py'):
+            paths.add(cache_path(path_i))
+            # Bytecode file next to source (i.e., Python 2 style).
+            paths.add(path_i + 'c')
+            paths.add(path_i + 'o')
+    for root, dirs, files in os.walk(os.path.abspath(dist_info)):
+        paths.update(os.path.join(root, filename) for filename in files)
+    return sorted(paths)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError as exception:
+        if exception.errno != errno.ENOENT:
+            return path, str(exception)
+    return path, None
+
+
+def remove_files(paths, roots, jobs=None):
+    '''
+    Remove files using a pool of threads, then remove directories left empty.
+
+    Parameters
+    ----------
+    paths : list
+        Absolute file paths.
+    roots : list
+        Directories which are never removed, and above which empty
+        directories are not removed.
+    jobs : int, optional
+        Number of threads (default: ``4 * number of CPUs``).
+
+    Returns
+    -------
+    list
+        ``(path, error message)`` tuples for files which could not be
+        removed.
+    '''
+    from multiprocessing.pool import ThreadPool
+    import multiprocessing
+
+    paths = list(paths)
+    if jobs is None:
+        jobs = 4 * multiprocessing.cpu_count()
+    jobs = max(1, min(jobs, len(paths)))
+    if paths:
+        pool = ThreadPool(jobs)
+        try:
+            results = pool.map(_remove_file, paths)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = []
+
+    roots = set(os.path.normpath(root_i) for root_i in roots)
+    directories = set()
+    for path_i in paths:
+        parent_i = os.path.dirname(path_i)
+        while (parent_i not in roots and parent_i not in directories and
+               _is_within(parent_i, roots)):
+            directories.add(parent_i)
+            parent_i = os.path.dirname(parent_i)
+    # Remove deepest directories first.
+    for directory_i in sorted(directories, key=len, reverse=True):
+        try:
+            os.rmdir(directory_i)
+        except OSError:
+            # Not empty (or already removed).
+            pass
+    return [(path_i, error_i) for path_i, error_i in results if error_i]
@@ -0,0 +1,363 @@
+'''
+Release table supporting fast version queries.
+
+A :class:`ReleaseTable` is an ordered dictionary of release information,
+indexed by version string (as returned by :func:`pip_helpers.get_releases`),
+which also keeps a version-sorted index of parsed version keys.  Range
+queries (e.g., ``">=1.0,<2.0"``), the latest ``N`` releases, and the latest
+release matching a set of specifiers are answered by bisecting the index
+rather than scanning every release.
+'''
+from collections import OrderedDict
+import bisect
+import re
+
+
+COMPARE_PATTERN = r'(!=|==|>=|<=|>|<)'
+# Version, optionally with trailing wildcard (e.g., `1.4.*`; only valid for
+# `==` and `!=`).
+VERSION_PATTERN = r'[\w\._]*[\w_](\.\*)?'
+CRE_VERSION_SPECIFIERS = re.compile(r'(?P<comparator>{compare_pattern})'
+                                    r'\s*(?P<version>{version_pattern})'
+                                    .format(compare_pattern=COMPARE_PATTERN,
+                                            version_pattern=VERSION_PATTERN),
+                                    re.VERBOSE)
+# Define regex to check for pre-release (for versions without a PEP 440
+# pre-release flag).
+CRE_PRE = re.compile(r'\.dev|\.pre')
+
+
+def parse_version(version):
+    '''
+    Returns
+    -------
+    object
+        Sortable key for version string (see
+        :func:`pkg_resources.parse_version`).
+    '''
+    import pkg_resources
+
+    return pkg_resources.parse_version(version)
+
+
+def is_pre(version, key=None):
+    '''
+    Parameters
+    ----------
+    version : str
+        Version string.
+    key : object, optional
+        Parsed version (see :func:`parse_version`).
+
+    Returns
+    -------
+    bool
+        ``True`` if version denotes a pre-release (i.e., a `PEP 440`_
+        development, alpha, beta or release candidate release).
+
+
+    .. _PEP 440: https://www.python.org/dev/peps/pep-0440/#pre-releases
+    '''
+    if key is None:
+        key = parse_version(version)
+    is_prerelease = getattr(key, 'is_prerelease', None)
+    if is_prerelease is None:
+        return bool(CRE_PRE.search(version))
+    return is_prerelease
+
+
+def wildcard_range(version):
+    '''
+    Parameters
+    ----------
+    version : str
+        Version prefix with trailing wildcard (e.g., ``"1.4.*"``).
+
+    Returns
+    -------
+    (str, str)
+        Lowest version matching ``version`` and lowest version above the
+        matching versions (e.g., ``("1.4.dev0", "1.5.dev0")``).
+    '''
+    prefix = version[:-len('.*')]
+    parts = prefix.split('.')
+    parts[-1] = str(int(re.match(r'\d+', parts[-1]).group()) + 1)
+    return prefix + '.dev0', '.'.join(parts) + '.dev0'
+
+
+class _Excluded(object):
+    '''
+    Version keys excluded by ``!=`` comparators.
+    '''
+    def __init__(self):
+        self.keys = set()
+        # `(lower, upper)` key ranges excluded by wildcard comparators.
+        self.ranges = []
+
+    def __contains__(self, key):
+        return key in self.keys or any(lower_i <= key < upper_i
+                                       for lower_i, upper_i in self.ranges)
+
+
+def parse_specifiers(specifiers):
+    '''
+    Parameters
+    ----------
+    specifiers : str or None
+        Version specifiers (e.g., ``">=1.0,<2.0"``).
+
+    Returns
+    -------
+    list
+        ``(comparator, version)`` tuples (e.g., ``[('>=', '1.0'), ('<',
+        '2.0')]``).
+    '''
+    if not specifiers:
+        return []
+    return [(m.group('comparator'), m.group('version'))
+            for m in CRE_VERSION_SPECIFIERS.finditer(specifiers)]
+
+
+class ReleaseTable(OrderedDict):
+    '''
+    Ordered dictionary of releases with a version-sorted index.
+
+    The index is built on first query and rebuilt after the table is
+    modified.  Parsed version keys are computed at most once per version.
+    '''
+    def __init__(self, *args, **kwargs):
+        self._version_keys = {}
+        self._index = None
+        super(ReleaseTable, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def from_items(cls, items, key=None):
+        '''
+        Create table from ``(version, release_info)`` items.
+
+        Parameters
+        ----------
+        items : list
+            ``(version, release_info)`` items.
+        key : function, optional
+            Key function to sort items by (default: parsed version).
+        '''
+        items = list(items)
+        version_keys = dict((k, parse_version(k)) for k, v in items)
+        if key is None:
+            items.sort(key=lambda item: version_keys[item[0]])
+        else:
+            items.sort(key=key)
+        table = cls(items)
+        table._version_keys.update(version_keys)
+        return table
+
+    # Invalidate index on modification.
+    def __setitem__(self, key, value, *args, **kwargs):
+        self._index = None
+        super(ReleaseTable, self).__setitem__(key, value, *args, **kwargs)
+
+    def __delitem__(self, key, *args, **kwargs):
+        self._index = None
+        super(ReleaseTable, self).__delitem__(key, *args, **kwargs)
+
+    def clear(self):
+        self._index = None
+        super(ReleaseTable, self).clear()
+
+    def version_key(self, version):
+        '''
+        Returns
+        -------
+        object
+            Parsed (i.e., sortable) key for version string.
+        '''
+        if version not in self._version_keys:
+            self._version_keys[version] = parse_version(version)
+        return self._version_keys[version]
+
+    def _get_index(self):
+        if self._index is None:
+            versions = sorted(self, key=self.version_key)
+            keys = [self.version_key(v) for v in versions]
+            pre = [is_pre(v, k) for v, k in zip(versions, keys)]
+            self._index = {'versions': versions, 'keys': keys, 'pre': pre,
+                           'latest_stable': next((v for v, p in
+                                                  zip(reversed(versions),
+                                                      reversed(pre))
+                                                  if not p), None),
+                           'latest_pre': next((v for v, p in
+                                               zip(reversed(versions),
+                                                   reversed(pre))
+                                               if p), None)}
+        return self._index
+
+    @property
+    def versions(self):
+        '''
+        List of version strings in ascending version order.
+        '''
+        return list(self._get_index()['versions'])
+
+    @property
+    def latest_stable(self):
+        '''
+        Latest release which is not a pre-release (or ``None``).
+        '''
+        return self._get_index()['latest_stable']
+
+    @property
+    def latest_pre(self):
+        '''
+        Latest pre-release (or ``None``).
+        '''
+        return self._get_index()['latest_pre']
+
+    def _bounds(self, comparators):
+        '''
+        Returns
+        -------
+        (int, int, set)
+            Start and end positions within version-sorted index of versions
+            matching ``comparators`` and container of excluded version keys
+            (i.e., from ``!=`` comparators).
+
+        Raises
+        ------
+        ValueError
+            If a wildcard version is used with a comparator other than
+            ``==`` or ``!=`` (see `PEP 440`_).
+
+
+        .. _PEP 440: https://www.python.org/dev/peps/pep-0440/#version-matching
+        '''
+        keys = self._get_index()['keys']
+        start, end = 0, len(keys)
+        excluded = _Excluded()
+        for comparator, version in comparators:
+            if version.endswith('.*'):
+                if comparator not in ('==', '!='):
+                    raise ValueError('Wildcard version `{}` is only valid '
+                                     'with `==` or `!=`.'
+                                     .format(comparator + version))
+                # Prefix match, e.g., `==1.4.*` matches `1.4.dev0` up to
+                # (excluding) `1.5.dev0`.
+                lower, upper = map(parse_version, wildcard_range(version))
+                if comparator == '!=':
+                    excluded.ranges.append((lower, upper))
+                else:
+                    start = max(start, bisect.bisect_left(keys, lower))
+                    end = min(end, bisect.bisect_left(keys, upper))
+                continue
+            key = parse_version(version)
+            if comparator == '!=':
+                excluded.keys.add(key)
+                continue
+            if comparator in ('>=', '=='):
+                start = max(start, bisect.bisect_left(keys, key))
+            elif comparator == '>':
+                position = bisect.bisect_right(keys, key)
+                if (getattr(key, 'base_version', None) is not None and
+                        key.public == key.base_version):
+                    # `>V` excludes post-releases (and local versions) of
+                    # `V` unless `V` is itself a post-release (see PEP 440).
+                    while (position < len(keys) and
+                           getattr(keys[position], 'base_version', None) and
+                           parse_version(keys[position].base_version) ==
+                           key):
+                        position += 1
+                start = max(start, position)
+            if comparator in ('<=', '=='):
+                end = min(end, bisect.bisect_right(keys, key))
+            elif comparator == '<':
+                if (getattr(key, 'base_version', None) is not None and
+                        key.public == key.base_version):
+                    # `<V` excludes pre-releases of `V` (see PEP 440), which
+                    # sort after `V.dev0`.
+                    key = parse_version(version + '.dev0')
+                end = min(end, bisect.bisect_left(keys, key))
+        return start, end, excluded
+
+    def range(self, specifiers=None, pre=True):
+        '''
+        Parameters
+        ----------
+        specifiers : str or list, optional
+            Version specifiers (e.g., ``">=1.0,<2.0"``) or list of
+            ``(comparator, version)`` tuples.
+        pre : bool, optional
+            Include pre-releases.
+
+        Returns
+        -------
+        list
+            Matching version strings in ascending version order.
+        '''
+        if not isinstance(specifiers, (list, tuple)):
+            specifiers = parse_specifiers(specifiers)
+        index = self._get_index()
+        start, end, excluded = self._bounds(specifiers)
+        return [version_i for version_i, key_i, pre_i in
+                zip(index['versions'][start:end], index['keys'][start:end],
+                    index['pre'][start:end])
+                if key_i not in excluded and (pre or not pre_i)]
+
+    def latest(self, n=1, pre=False):
+        '''
+        Returns
+        -------
+        list
+            Up to ``n`` latest version strings, in ascending version order.
+        '''
+        index = self._get_index()
+        versions = index['versions']
+        if pre:
+            return versions[-n:] if n > 0 else []
+        latest = []
+        for version_i, pre_i in zip(reversed(versions),
+                                    reversed(index['pre'])):
+            if len(latest) >= n:
+                break
+            if not pre_i:
+                latest.insert(0, version_i)
+        return latest
+
+    def latest_matching(self, specifiers=None, pre=False):
+        '''
+        Returns
+        -------
+        str or None
+            Latest version string matching ``specifiers`` (see
+            :meth:`range`), or ``None`` if no version matches.
+        '''
+        if not specifiers:
+            if not pre:
+                return self.latest_stable
+            versions = self._get_index()['versions']
+            return versions[-1] if versions else None
+        if not isinstance(specifiers, (list, tuple)):
+            specifiers = parse_specifiers(specifiers)
+        index = self._get_index()
+        start, end, excluded = self._bounds(specifiers)
+        for i in range(end - 1, start - 1, -1):
+            version_i = index['versions'][i]
+            if (index['keys'][i] not in excluded and
+                    (pre or not index['pre'][i])):
+                return version_i
+        return None
+
+    def filter(self, specifiers=None, pre=True):
+        '''
+        Returns
+        -------
+        ReleaseTable
+            Releases matching ``specifiers`` (see :meth:`range`), in the same
+            order as this table.
+        '''
+        matching = set(self.range(specifiers, pre=pre))
+        table = self.__class__((k, v) for k, v in self.items()
+                               if k in matching)
+        table._version_keys.update((k, self._version_keys[k])
+                                   for k in matching
+                                   if k in self._version_keys)
+        return table
@@ -0,0 +1,373 @@
+'''
+Parse requirements files, e.g., for batch :func:`pip_helpers.install` or
+:func:`pip_helpers.get_releases` calls.
+
+:func:`iter_requirements` streams the requirements of a file, following
+``-r``/``--requirement`` includes and ``-c``/``--constraint`` files, and
+parsing extras and `environment markers`_.  Each file is parsed once per
+process: the parsed lines are cached by hash of the file contents, and each
+distinct marker is evaluated once for the running interpreter.
+
+Example usage:
+
+.. code-block:: python
+
+    >>> import pip_helpers as ph
+    >>> from pip_helpers.requirements import load_requirements
+    >>>
+    >>> requirements = load_requirements('requirements.txt')
+    >>> [ph.get_releases(r.descriptor) for r in requirements.values()]
+    >>> ph.install([str(r) for r in requirements.values()])
+
+Notes
+-----
+Editable requirements (``-e``), bare URLs or paths and global options (e.g.,
+``--index-url``) are skipped.  Per-requirement options (e.g., ``--hash``) are
+ignored.
+
+
+.. _environment markers:
+    https://www.python.org/dev/peps/pep-0508/#environment-markers
+'''
+from collections import OrderedDict, namedtuple
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+
+from . import metrics
+from .cache import normalize_name
+from .release_table import wildcard_range
+
+
+logger = logging.getLogger(__name__)
+
+CRE_COMMENT = re.compile(r'(^|\s+)#.*$')
+CRE_INCLUDE = re.compile(r'^(-(?P<short>[rc])\s*|--(?P<long>requirement|'
+                         r'constraint)(\s*=\s*|\s+))(?P<path>\S+)$')
+# Per-requirement options (e.g., `--hash=sha256:...`).
+CRE_OPTIONS = re.compile(r'\s+--\w.*$')
+CRE_REQUIREMENT = re.compile(r'''
+    ^(?P<name>[A-Za-z0-9]([\w\.\-]*[A-Za-z0-9])?)\s*
+     (\[(?P<extras>[^\]]*)\])?\s*
+     (@\s*(?P<url>\S+)\s*|
+      \(?\s*(?P<specifiers>(~=|===|!=|==|>=|<=|>|<)\s*[\w\.\*\+!]+
+       (\s*,\s*(~=|===|!=|==|>=|<=|>|<)\s*[\w\.\*\+!]+)*)?\s*\)?\s*)
+     (;\s*(?P<marker>.+?))?\s*$''', re.VERBOSE)
+CRE_SPECIFIER = re.compile(r'(?P<comparator>~=|===|!=|==|>=|<=|>|<)\s*'
+                           r'(?P<version>[\w\.\*\+!]+)')
+# Release segment of version (e.g., `1.4` of `1.4.post1`).
+CRE_RELEASE = re.compile(r'^\d+(\.\d+)*')
+
+# Parsed lines of each file, keyed by SHA256 digest of file contents.
+_PARSED = {}
+_PARSED_LOCK = threading.Lock()
+# Result of each marker evaluated for the running interpreter.
+_MARKERS = {}
+
+
+class Requirement(namedtuple('Requirement', 'name extras specifiers url '
+                             'marker constraint path lineno')):
+    '''
+    Requirement parsed from requirements file.
+
+    Attributes
+    ----------
+    name : str
+        Package name (as written).
+    extras : tuple
+        Names of extras.
+    specifiers : list
+        ``(comparator, version)`` tuples.
+    url : str or None
+        URL of direct reference (i.e., ``name @ url``).
+    marker : str or None
+        Environment marker.
+    constraint : bool
+        ``True`` if read from a constraints file.
+    path : str
+        Path of requirements file.
+    lineno : int
+        Line number in requirements file.
+    '''
+    @property
+    def key(self):
+        return normalize_name(self.name)
+
+    @property
+    def descriptor(self):
+        '''
+        Package descriptor as accepted by :func:`pip_helpers.get_releases`
+        (e.g., ``"foo>=1.4.2,<1.5"`` for ``foo[bar]~=1.4.2``, or
+        ``"foo>=1.4.dev0,<1.5.dev0"`` for ``foo==1.4.*``).
+        '''
+        specifiers = []
+        for comparator_i, version_i in self.specifiers:
+            match_i = CRE_RELEASE.match(version_i)
+            release_i = match_i.group().split('.') if match_i else []
+            if comparator_i == '~=' and len(release_i) > 1:
+                # Compatible release (only the release segment is
+                # truncated), e.g., `~=1.4.post1` -> `>=1.4.post1,<2`.
+                upper_i = release_i[:-2] + [str(int(release_i[-2]) + 1)]
+                specifiers += [('>=', version_i), ('<', '.'.join(upper_i))]
+            elif comparator_i == '==' and version_i.endswith('.*'):
+                # Prefix match, e.g., `==1.4.*` -> `>=1.4.dev0,<1.5.dev0`.
+                # N.B., `!=1.4.*` cannot be written as a range, so is passed
+                # as is (see `ReleaseTable`).
+                lower_i, upper_i = wildcard_range(version_i)
+                specifiers += [('>=', lower_i), ('<', upper_i)]
+            elif comparator_i in ('~=', '==='):
+                specifiers.append(('>=' if comparator_i == '~=' else '==',
+                                   version_i))
+            else:
+                specifiers.append((comparator_i, version_i))
+        return self.name + ','.join(comparator_i + version_i
+                                    for comparator_i, version_i in specifiers)
+
+    def __str__(self):
+        # Requirement as accepted by `pip install` (marker already
+        # evaluated).
+        extras = '[{}]'.format(','.join(self.extras)) if self.extras else ''
+        if self.url:
+            return '{}{} @ {}'.format(self.name, extras, self.url)
+        return '{}{}{}'.format(self.name, extras,
+                               ','.join(comparator_i + version_i
+                                        for comparator_i, version_i
+                                        in self.specifiers))
+
+
+def evaluate_marker(marker):
+    '''
+    Returns
+    -------
+    bool
+        ``True`` if environment marker applies to the running interpreter.
+        Each distinct marker is only evaluated once.
+
+    Raises
+    ------
+    ValueError
+        If marker is invalid.
+    '''
+    try:
+        return _MARKERS[marker]
+    except KeyError:
+        pass
+    try:
+        from packaging.markers import InvalidMarker, Marker
+    except ImportError:
+        import pkg_resources
+
+        try:
+            result = pkg_resources.evaluate_marker(marker)
+        except SyntaxError as exception:
+            raise ValueError('Invalid marker `{}`: {}'.format(marker,
+                                                              exception))
+    else:
+        try:
+            # Requirements files are not installed as an extra.
+            result = Marker(marker).evaluate({'extra': ''})
+        except InvalidMarker as exception:
+            raise ValueError('Invalid marker `{}`: {}'.format(marker,
+                                                              exception))
+    _MARKERS[marker] = bool(result)
+    return _MARKERS[marker]
+
+
+def _logical_lines(stream):
+    '''
+    Yield ``(line number, line)`` tuples, with comments stripped and
+    continuation lines (i.e., ending with ``\\``) joined.
+    '''
+    lines = []
+    lineno = None
+    for lineno_i, line_i in enumerate(stream, 1):
+        line_i = line_i.rstrip('\r\n')
+        if lineno is None:
+            lineno = lineno_i
+        if line_i.endswith('\\'):
+            lines.append(line_i[:-1])
+            continue
+        lines.append(line_i)
+        line = CRE_COMMENT.sub('', ''.join(lines)).strip()
+        if line:
+            yield lineno, line
+        lines = []
+        lineno = None
+    if lines:
+        line = CRE_COMMENT.sub('', ''.join(lines)).strip()
+        if line:
+            yield lineno, line
+
+
+def parse_line(line, path='<string>', lineno=0):
+    '''
+    Returns
+    -------
+    tuple or None
+        ``("include", path, constraint)`` for ``-r``/``-c`` lines,
+        ``("requirement", Requirement)`` for requirement lines, or ``None``
+        for lines which are skipped (see module notes).
+    '''
+    match = CRE_INCLUDE.match(line)
+    if match:
+        kind = match.group('short') or match.group('long')[0]
+        return 'include', match.group('path'), kind == 'c'
+    if line.startswith('-'):
+        logger.debug('Skipping option `%s` (%s:%d).', line, path, lineno)
+        return None
+    match = CRE_REQUIREMENT.match(CRE_OPTIONS.sub('', line))
+    if not match:
+        logger.warning('Skipping unsupported requirement `%s` (%s:%d).',
+                       line, path, lineno)
+        return None
+    extras = tuple(extra_i.strip() for extra_i in
+                   (match.group('extras') or '').split(',') if extra_i.strip())
+    specifiers = [(match_i.group('comparator'), match_i.group('version'))
+                  for match_i in CRE_SPECIFIER
+                  .finditer(match.group('specifiers') or '')]
+    return 'requirement', Requirement(match.group('name'), extras,
+                                      specifiers, match.group('url'),
+                                      match.group('marker'), False, path,
+                                      lineno)
+
+
+def _parse_file(path):
+    '''
+    Returns
+    -------
+    list
+        Parsed lines of file (see :func:`parse_line`).  Cached by hash of
+        file contents.
+    '''
+    with open(path, 'rb') as input_:
+        contents = input_.read()
+    digest = hashlib.sha256(contents).hexdigest()
+    with _PARSED_LOCK:
+        parsed = _PARSED.get(digest)
+    if parsed is not None:
+        metrics.increment('requirements.cache', result='hit')
+        return parsed
+    metrics.increment('requirements.cache', result='miss')
+    with metrics.timer('requirements.parse'):
+        stream = io.StringIO(contents.decode('utf-8'))
+        parsed = [line_i for line_i in
+                  (parse_line(line_j, path, lineno_j)
+                   for lineno_j, line_j in _logical_lines(stream))
+                  if line_i is not None]
+    with _PARSED_LOCK:
+        _PARSED[digest] = parsed
+    return parsed
+
+
+def iter_requirements(path, evaluate=True, _constraint=False, _active=None):
+    '''
+    Iterate over requirements in requirements file.
+
+    Parameters
+    ----------
+    path : str
+        Path to requirements file.  Included files are resolved relative to
+        the including file.
+    evaluate : bool, optional
+        If ``True``, skip requirements whose environment marker does not
+        apply to the running interpreter.
+
+    Yields
+    ------
+    Requirement
+        Requirements (including those of constraints files, which are marked
+        as such), in file order.
+
+    Raises
+    ------
+    ValueError
+        If files include each other.
+    '''
+    path = os.path.abspath(path)
+    active = set() if _active is None else _active
+    if path in active:
+        raise ValueError('Recursive include of `{}`'.format(path))
+    active.add(path)
+    try:
+        for line_i in _parse_file(path):
+            if line_i[0] == 'include':
+                include_i = os.path.join(os.path.dirname(path), line_i[1])
+                for requirement_j in iter_requirements(include_i, evaluate,
+                                                       _constraint or
+                                                       line_i[2], active):
+                    yield requirement_j
+                continue
+            requirement_i = line_i[1]._replace(path=path,
+                                               constraint=_constraint)
+            if (evaluate and requirement_i.marker is not None and
+                    not evaluate_marker(requirement_i.marker)):
+                continue
+            yield requirement_i
+    finally:
+        active.discard(path)
+
+
+def load_requirements(path, evaluate=True):
+    '''
+    Load requirements file, applying constraints.
+
+    Parameters
+    ----------
+    path : str
+        Path to requirements file.
+    evaluate : bool, optional
+        See :func:`iter_requirements`.
+
+    Returns
+    -------
+    collections.OrderedDict
+        Requirements keyed by normalized name, in file order.  Requirements
+        for the same package are merged, and the specifiers of constraints
+        for a package are added to the specifiers of its requirement.
+        Packages which are only constrained are not included.
+    '''
+    requirements = OrderedDict()
+    constraints = {}
+    for requirement_i in iter_requirements(path, evaluate=evaluate):
+        key_i = requirement_i.key
+        if requirement_i.constraint:
+            constraints.setdefault(key_i, []).append(requirement_i)
+        elif key_i in requirements:
+            existing_i = requirements[key_i]
+            extras_i = existing_i.extras + tuple(extra_j for extra_j in
+                                                 requirement_i.extras
+                                                 if extra_j not in
+                                                 existing_i.extras)
+            requirements[key_i] = existing_i._replace(
+                extras=extras_i, specifiers=existing_i.specifiers +
+                requirement_i.specifiers, url=existing_i.url or
+                requirement_i.url)
+        else:
+            requirements[key_i] = requirement_i
+    for key_i, constraints_i in constraints.items():
+        if key_i not in requirements:
+            continue
+        requirement_i = requirements[key_i]
+        for constraint_j in constraints_i:
+            requirement_i = requirement_i._replace(
+                specifiers=requirement_i.specifiers + [specifier_k for
+                                                       specifier_k in
+                                                       constraint_j.specifiers
+                                                       if specifier_k not in
+                                                       requirement_i
+                                                       .specifiers],
+                url=requirement_i.url or constraint_j.url)
+        requirements[key_i] = requirement_i
+    return requirements
+
+
+def clear_cache():
+    '''
+    Discard cached parsed files and marker results.
+    '''
+    with _PARSED_LOCK:
+        _PARSED.clear()
+    _MARKERS.clear()
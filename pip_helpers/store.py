@@ -0,0 +1,376 @@
+'''
+SQLite-backed store of package index release metadata.
+
+A :class:`ReleaseStore` persists packages, releases and release files in an
+indexed SQLite database.  It provides the same interface as
+:class:`pip_helpers.cache.MetadataCache`, so it may be passed as the
+``cache`` argument of :func:`pip_helpers.get_releases` (which fills the store
+from the JSON API on a miss) and kept current using
+:class:`pip_helpers.sync.MetadataSync`.  A store holds the metadata of a
+single index; entries of other indexes are neither served nor stored.  It
+also answers cross-package queries in a single SQL query, e.g.,
+:meth:`ReleaseStore.released_since` and :meth:`ReleaseStore.latest_versions`.
+
+Example usage:
+
+.. code-block:: python
+
+    >>> import pip_helpers as ph
+    >>> from pip_helpers.store import ReleaseStore
+    >>>
+    >>> store = ReleaseStore('releases.sqlite')
+    >>> ph.get_releases('natsort', cache=store)
+    >>> store.latest_versions(['natsort', 'requests'], fill=True)
+    OrderedDict([('natsort', u'5.0.1'), ('requests', u'2.11.1')])
+'''
+from collections import OrderedDict
+import datetime as dt
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from . import fetch
+from . import metrics
+from .cache import normalize_name
+from .release_table import is_pre, parse_version
+
+
+logger = logging.getLogger(__name__)
+
+#: Default URL of JSON API (see :data:`pip_helpers.DEFAULT_SERVER_URL`).
+DEFAULT_SERVER_URL = 'https://pypi.python.org/pypi/{}/json'
+# Maximum number of parameters per query (SQLite default limit is 999).
+MAX_PARAMETERS = 900
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS packages (
+    name TEXT PRIMARY KEY,
+    display_name TEXT NOT NULL,
+    info TEXT,
+    public_known INTEGER NOT NULL DEFAULT 0,
+    hidden_url TEXT,
+    fetched_at REAL);
+CREATE TABLE IF NOT EXISTS releases (
+    package TEXT NOT NULL REFERENCES packages (name) ON DELETE CASCADE,
+    version TEXT NOT NULL,
+    version_rank INTEGER NOT NULL,
+    is_pre INTEGER NOT NULL,
+    public INTEGER,
+    upload_time TEXT,
+    PRIMARY KEY (package, version));
+CREATE INDEX IF NOT EXISTS releases_version_rank
+    ON releases (package, version_rank);
+CREATE INDEX IF NOT EXISTS releases_upload_time ON releases (upload_time);
+CREATE TABLE IF NOT EXISTS files (
+    package TEXT NOT NULL,
+    version TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    packagetype TEXT,
+    python_version TEXT,
+    requires_python TEXT,
+    size INTEGER,
+    upload_time TEXT,
+    url TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (package, version, filename),
+    FOREIGN KEY (package, version) REFERENCES releases (package, version)
+        ON DELETE CASCADE);
+CREATE INDEX IF NOT EXISTS files_upload_time ON files (upload_time);
+'''
+
+
+def _chunks(items, size=MAX_PARAMETERS):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class ReleaseStore(object):
+    '''
+    SQLite-backed metadata store.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to database file (default: in-memory database).
+    server_url : str, optional
+        URL of JSON API the metadata is fetched from (see
+        :func:`pip_helpers.get_releases`).  Persisted in the database.
+    ttl : float, optional
+        Seconds after which entries are no longer served by :meth:`get`
+        (default: never, e.g., if kept current by
+        :class:`pip_helpers.sync.MetadataSync`).
+
+    Raises
+    ------
+    ValueError
+        If the database holds the metadata of another index.
+
+    Attributes
+    ----------
+    serial : int or None
+        Index changelog serial the entries are current to (see
+        :class:`pip_helpers.sync.MetadataSync`).  Persisted in the database.
+    '''
+    def __init__(self, path=':memory:', server_url=DEFAULT_SERVER_URL,
+                 ttl=None):
+        self.path = path
+        self.server_url = server_url
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+            self._connection.execute('INSERT OR IGNORE INTO meta (key, '
+                                     'value) VALUES (?, ?)',
+                                     ('server_url', server_url))
+        stored_url = self._query('SELECT value FROM meta WHERE key = ?',
+                                 ('server_url', ))[0][0]
+        if stored_url != server_url:
+            self.close()
+            raise ValueError('Store `{}` holds metadata of `{}`, not `{}`.'
+                             .format(path, stored_url, server_url))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self._lock, metrics.timer('store.query'):
+            return self._connection.execute(sql, parameters).fetchall()
+
+    @property
+    def serial(self):
+        rows = self._query('SELECT value FROM meta WHERE key = ?',
+                           ('serial', ))
+        return int(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    @serial.setter
+    def serial(self, value):
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO meta (key, '
+                                     'value) VALUES (?, ?)',
+                                     ('serial', value))
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM packages')[0][0]
+
+    def __contains__(self, name):
+        return bool(self._query('SELECT 1 FROM packages WHERE name = ?',
+                                (normalize_name(name), )))
+
+    def names(self):
+        '''
+        Returns
+        -------
+        list
+            Sorted list of names of stored packages.
+        '''
+        return [row[0] for row in
+                self._query('SELECT display_name FROM packages ORDER BY '
+                            'name')]
+
+    def _other_index(self, index_url):
+        if index_url is None or index_url == self.server_url:
+            return False
+        logger.debug('Not caching metadata of index `%s` in store of `%s`.',
+                     index_url, self.server_url)
+        return True
+
+    def get(self, name, index_url=None):
+        '''
+        Returns
+        -------
+        dict or None
+            Entry for package (see :class:`pip_helpers.cache.MetadataCache`),
+            or ``None`` if not stored, expired, or ``index_url`` is not the
+            index of the store.
+        '''
+        if self._other_index(index_url):
+            return None
+        name = normalize_name(name)
+        with self._lock:
+            packages = self._query('SELECT info, public_known, hidden_url, '
+                                   'fetched_at FROM packages WHERE name = ?',
+                                   (name, ))
+            if not packages or (self.ttl is not None and time.time() -
+                                (packages[0][3] or 0) > self.ttl):
+                return None
+            releases = self._query('SELECT version, public FROM releases '
+                                   'WHERE package = ? ORDER BY version_rank',
+                                   (name, ))
+            files = self._query('SELECT version, data FROM files WHERE '
+                                'package = ? ORDER BY rowid', (name, ))
+        info, public_known, hidden_url, fetched_at = packages[0]
+        package_releases = OrderedDict((version, [])
+                                       for version, public in releases)
+        for version, data in files:
+            package_releases[version].append(json.loads(data))
+        return {'package_data': {'info': json.loads(info) if info else None,
+                                 'releases': package_releases},
+                'public_releases': ([version for version, public in releases
+                                     if public] if public_known else None),
+                'hidden_url': hidden_url}
+
+    def put(self, name, entry, index_url=None):
+        '''
+        Store (or replace) entry for package (ignored if ``index_url`` is not
+        the index of the store).
+        '''
+        if self._other_index(index_url):
+            return
+        package_data = entry['package_data']
+        public_releases = entry.get('public_releases')
+        if public_releases is not None:
+            public_releases = set(public_releases)
+        key = normalize_name(name)
+        info = package_data.get('info') or {}
+        versions = sorted(package_data['releases'], key=parse_version)
+
+        release_rows = []
+        file_rows = []
+        for rank, version in enumerate(versions):
+            files = package_data['releases'][version]
+            upload_times = [f['upload_time'] for f in files
+                            if f.get('upload_time')]
+            release_rows.append((key, version, rank, is_pre(version),
+                                 None if public_releases is None
+                                 else version in public_releases,
+                                 min(upload_times) if upload_times else None))
+            file_rows.extend((key, version, f['filename'],
+                              f.get('packagetype'), f.get('python_version'),
+                              f.get('requires_python'), f.get('size'),
+                              f.get('upload_time'), f.get('url'),
+                              json.dumps(f)) for f in files)
+
+        with self._lock, self._connection, metrics.timer('store.put'):
+            self._connection.execute('DELETE FROM packages WHERE name = ?',
+                                     (key, ))
+            self._connection.execute('INSERT INTO packages (name, '
+                                     'display_name, info, public_known, '
+                                     'hidden_url, fetched_at) VALUES (?, ?, '
+                                     '?, ?, ?, ?)',
+                                     (key, info.get('name', name),
+                                      json.dumps(info),
+                                      public_releases is not None,
+                                      entry.get('hidden_url'), time.time()))
+            self._connection.executemany('INSERT INTO releases VALUES '
+                                         '(?, ?, ?, ?, ?, ?)', release_rows)
+            self._connection.executemany('INSERT INTO files (package, '
+                                         'version, filename, packagetype, '
+                                         'python_version, requires_python, '
+                                         'size, upload_time, url, data) '
+                                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '
+                                         '?)', file_rows)
+
+    def invalidate(self, names):
+        '''
+        Discard entries for the specified package names.
+        '''
+        keys = [(normalize_name(name_i), ) for name_i in names]
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM packages WHERE name = ?',
+                                         keys)
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM packages')
+
+    def fill(self, names, refresh=False, timeout=fetch.DEFAULT_TIMEOUT,
+             retries=fetch.DEFAULT_RETRIES):
+        '''
+        Fetch metadata of packages from the JSON API into the store.
+
+        Parameters
+        ----------
+        names : list
+            Package names.
+        refresh : bool, optional
+            If ``True``, also fetch packages which are already stored.
+
+        See :func:`pip_helpers.get_releases` for other parameters.
+
+        Returns
+        -------
+        list
+            Names of packages which were fetched.
+        '''
+        fetched = []
+        for name_i in names:
+            if not refresh and name_i in self:
+                continue
+            with metrics.timer('store.fetch'):
+                package_data = fetch.fetch_json(self.server_url
+                                                .format(name_i),
+                                                timeout=timeout,
+                                                retries=retries)
+            self.put(name_i, {'package_data': package_data,
+                              'public_releases': None})
+            fetched.append(name_i)
+        return fetched
+
+    def released_since(self, days, pre=True):
+        '''
+        Parameters
+        ----------
+        days : float
+            Number of days.
+        pre : bool, optional
+            Include pre-releases.
+
+        Returns
+        -------
+        list
+            ``(package_name, version, upload_time)`` tuples of stored
+            releases uploaded in the last ``days`` days, most recent last.
+        '''
+        since = (dt.datetime.utcnow() -
+                 dt.timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%S')
+        return self._query('SELECT p.display_name, r.version, r.upload_time '
+                           'FROM releases r JOIN packages p ON p.name = '
+                           'r.package WHERE r.upload_time >= ? {} ORDER BY '
+                           'r.upload_time'.format('' if pre else
+                                                  'AND NOT r.is_pre'),
+                           (since, ))
+
+    def latest_versions(self, names, pre=False, fill=False, **kwargs):
+        '''
+        Parameters
+        ----------
+        names : list
+            Package names.
+        pre : bool, optional
+            Consider pre-releases.
+        fill : bool, optional
+            If ``True``, first fetch packages which are not stored (see
+            :meth:`fill`; keyword arguments are passed on).
+
+        Returns
+        -------
+        collections.OrderedDict
+            Latest version of each package (or ``None`` if not stored or no
+            matching release), keyed by name as given.  Releases without
+            files are ignored (as by :func:`pip_helpers.get_releases`).
+        '''
+        names = list(names)
+        if fill:
+            self.fill(names, **kwargs)
+        keys = OrderedDict((name_i, normalize_name(name_i))
+                           for name_i in names)
+        latest = {}
+        for keys_i in _chunks(list(set(keys.values()))):
+            placeholders = ', '.join('?' * len(keys_i))
+            latest.update(self._query(
+                'SELECT r.package, r.version FROM releases r JOIN '
+                '(SELECT package, MAX(version_rank) AS version_rank FROM '
+                'releases WHERE package IN ({}) {} AND EXISTS (SELECT 1 '
+                'FROM files f WHERE f.package = releases.package AND '
+                'f.version = releases.version) GROUP BY package) l ON '
+                'r.package = l.package AND r.version_rank = l.version_rank'
+                .format(placeholders, '' if pre else 'AND NOT is_pre'),
+                keys_i))
+        return OrderedDict((name_i, latest.get(key_i))
+                           for name_i, key_i in keys.items())
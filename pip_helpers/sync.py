@@ -0,0 +1,128 @@
+'''
+Incremental synchronization of cached metadata with the package index.
+
+The package index XML-RPC API assigns an increasing *serial* to each change
+(e.g., new release, new file, removal).  :class:`MetadataSync` records the
+last serial seen by a metadata cache and periodically asks the index for the
+names of packages changed since, invalidating exactly those cache entries.
+Cached entries may then be served without revalidating them on every query.
+
+Example usage:
+
+.. code-block:: python
+
+    >>> import pip_helpers as ph
+    >>> from pip_helpers.cache import MetadataCache
+    >>> from pip_helpers.sync import MetadataSync
+    >>>
+    >>> cache = MetadataCache()
+    >>> sync = MetadataSync(cache)
+    >>> sync.start(interval=60)
+    >>> ph.get_releases('natsort', cache=cache)  # Fetched.
+    >>> ph.get_releases('natsort', cache=cache)  # Served from cache.
+'''
+import logging
+import threading
+import time
+
+from . import fetch
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+#: Default URL of XML-RPC API providing the changelog.
+DEFAULT_CHANGELOG_URL = 'https://pypi.python.org/pypi/'
+
+
+class MetadataSync(object):
+    '''
+    Keep metadata cache current using the index changelog serial.
+
+    Parameters
+    ----------
+    cache : cache.MetadataCache
+        Metadata store to invalidate.  Must provide ``invalidate(names)``,
+        ``clear()`` and a ``serial`` attribute.
+    url : str, optional
+        URL of XML-RPC API.
+    timeout : float or tuple, optional
+        Timeout for requests to the XML-RPC API (see
+        :func:`fetch.call_xmlrpc`).
+    '''
+    def __init__(self, cache, url=DEFAULT_CHANGELOG_URL,
+                 timeout=fetch.DEFAULT_TIMEOUT):
+        self.cache = cache
+        self.url = url
+        self.timeout = timeout
+        #: Time of last successful :meth:`sync` (or ``None``).
+        self.last_sync = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def sync(self):
+        '''
+        Invalidate cache entries of packages changed since last sync.
+
+        If the cache has no recorded serial, it is cleared (since it is not
+        known which entries are current) and the latest serial is recorded.
+
+        Returns
+        -------
+        list
+            Sorted list of changed package names.
+        '''
+        with self._lock, metrics.timer('sync.sync'):
+            serial = self.cache.serial
+            if serial is None:
+                serial = fetch.call_xmlrpc(self.url, 'changelog_last_serial',
+                                           timeout=self.timeout)
+                self.cache.clear()
+                changed = []
+            else:
+                # Each change is `[name, version, timestamp, action, serial]`.
+                changes = fetch.call_xmlrpc(self.url, 'changelog_since_serial',
+                                            (serial, ), timeout=self.timeout)
+                changed = sorted(set(change_i[0] for change_i in changes))
+                self.cache.invalidate(changed)
+                serial = max([serial] + [change_i[4]
+                                         for change_i in changes])
+            self.cache.serial = serial
+            self.last_sync = time.time()
+        metrics.increment('sync.invalidated', len(changed))
+        logger.debug('Synced to serial %s; %d package(s) changed.', serial,
+                     len(changed))
+        return changed
+
+    def start(self, interval=60.):
+        '''
+        Call :meth:`sync` every ``interval`` seconds in a background thread.
+
+        Errors are logged and the sync is retried after ``interval`` seconds.
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError('Sync already running.')
+        self._stop_event.clear()
+
+        def _run():
+            while not self._stop_event.is_set():
+                try:
+                    self.sync()
+                except Exception:
+                    logger.warning('Metadata sync failed.', exc_info=True)
+                self._stop_event.wait(interval)
+
+        self._thread = threading.Thread(target=_run,
+                                        name='pip_helpers-metadata-sync')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        '''
+        Stop background sync started with :meth:`start`.
+        '''
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
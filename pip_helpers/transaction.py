@@ -0,0 +1,264 @@
+'''
+Transactional changes to installed packages.
+
+A :class:`Snapshot` records the state of a set of installed distributions
+and their installed dependencies, i.e., the output of
+:func:`pip_helpers.freeze` and links (reflinks, hard links, or copies; see
+:class:`pip_helpers.linking.Linker`) to every file listed in their ``RECORD``
+files.  If a change fails, :meth:`Snapshot.rollback` removes the
+distributions installed since the snapshot and links the original files of
+changed distributions back into place, which takes seconds rather than a
+rebuild of the environment.
+
+Example usage:
+
+.. code-block:: python
+
+    >>> import pip_helpers as ph
+    >>> from pip_helpers.transaction import transaction
+    >>>
+    >>> with transaction(['foo', 'bar']):
+    ...     ph.install(['foo==2.0'])
+    ...     ph.install(['bar==3.0'])  # Error -> `foo` restored to original.
+
+Notes
+-----
+Hard links share contents with the original files.  ``pip`` removes (rather
+than overwrites) files of an upgraded distribution, so the linked snapshot
+still holds the original contents.
+'''
+from collections import OrderedDict
+import contextlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+from . import metrics
+from .cache import normalize_name
+from .linking import Linker
+from .record import distribution_files, find_dist_info, install_scheme
+
+
+logger = logging.getLogger(__name__)
+
+
+def _installed_dependencies(names, paths):
+    '''
+    Parameters
+    ----------
+    names : list
+        Package names.
+    paths : list
+        Directories of installed distributions (e.g., ``site-packages``).
+
+    Returns
+    -------
+    set
+        Normalized names of installed distributions among ``names`` and
+        their installed dependencies (recursively).
+    '''
+    import pkg_resources
+
+    installed = dict((normalize_name(dist_i.project_name), dist_i)
+                     for dist_i in pkg_resources.WorkingSet(paths))
+    closure = set()
+    pending = [normalize_name(name_i) for name_i in names]
+    while pending:
+        name_i = pending.pop()
+        if name_i in closure or name_i not in installed:
+            continue
+        closure.add(name_i)
+        try:
+            requires_i = installed[name_i].requires()
+        except Exception:
+            # e.g., invalid or missing metadata.
+            logger.debug('Cannot read requirements of `%s`.', name_i,
+                         exc_info=True)
+            continue
+        pending.extend(normalize_name(requirement_j.project_name)
+                       for requirement_j in requires_i)
+    return closure
+
+
+def _frozen_versions(frozen):
+    '''
+    Returns
+    -------
+    dict
+        Mapping from normalized package name to descriptor (e.g.,
+        ``"foo==1.0"``) for each line of :func:`pip_helpers.freeze` output.
+    '''
+    versions = {}
+    for line_i in frozen:
+        if line_i.startswith('-'):
+            # e.g., `-e git+...#egg=foo`
+            name_i = line_i.rpartition('#egg=')[-1]
+        else:
+            name_i = line_i.split('==')[0].split(' @ ')[0]
+        versions[normalize_name(name_i.strip())] = line_i
+    return versions
+
+
+class Snapshot(object):
+    '''
+    Snapshot of installed distributions.
+
+    Parameters
+    ----------
+    names : list
+        Names of packages which may be changed.  Packages which are not
+        installed are recorded as such (i.e., are removed on rollback).
+    mode : str, optional
+        Link mode (see :class:`pip_helpers.linking.Linker`).
+    dependencies : bool, optional
+        If ``True``, also snapshot the installed dependencies of ``names``
+        (recursively), which may be changed along with them.
+    '''
+    def __init__(self, names, mode='auto', dependencies=True):
+        self.names = [normalize_name(name_i) for name_i in names]
+        self.scheme = install_scheme()
+        self.mode = mode
+        self.dependencies = dependencies
+        self.frozen = None
+        self.directory = None
+        #: Lists of ``(original path, snapshot path)`` tuples, keyed by
+        #: name of snapshotted distribution.
+        self.files = OrderedDict()
+        #: Names of distributions which could not be snapshotted (e.g.,
+        #: installed using ``*.egg-info``).
+        self.untracked = []
+
+    @property
+    def roots(self):
+        return list(self.scheme.values()) + [sys.prefix]
+
+    def take(self):
+        '''
+        Record ``freeze`` state and link files of distributions.
+        '''
+        from . import freeze
+
+        site_packages_dir = self.scheme['purelib']
+        with metrics.timer('transaction.snapshot'):
+            self.frozen = freeze()
+            installed = _frozen_versions(self.frozen)
+            # Create snapshot on the same file system as the environment, so
+            # files may be hard linked.
+            self.directory = tempfile.mkdtemp(prefix='.pip_helpers-snapshot-',
+                                              dir=site_packages_dir)
+            linker = Linker(self.mode)
+            names = list(self.names)
+            paths = [self.scheme['purelib'], self.scheme['platlib']]
+            if self.dependencies:
+                names += sorted(_installed_dependencies(self.names, paths) -
+                                set(self.names))
+            count = 0
+            for name_i in names:
+                dist_info_i = find_dist_info(name_i, paths)
+                if dist_info_i is None:
+                    if name_i in installed:
+                        self.untracked.append(name_i)
+                    continue
+                files_i = self.files.setdefault(name_i, [])
+                for path_j in distribution_files(dist_info_i, self.roots):
+                    if not os.path.isfile(path_j):
+                        continue
+                    snapshot_j = os.path.join(self.directory, str(count))
+                    count += 1
+                    linker.link(path_j, snapshot_j)
+                    files_i.append((path_j, snapshot_j))
+        if self.untracked:
+            logger.warning('Cannot snapshot (and roll back) packages without '
+                           '`.dist-info`: %s', ', '.join(self.untracked))
+        logger.debug('Snapshot of %d distribution(s) in `%s`.',
+                     len(self.files), self.directory)
+        return self
+
+    def rollback(self):
+        '''
+        Restore environment to state of snapshot.
+
+        Distributions installed since the snapshot was taken are removed.
+        Snapshotted distributions which were changed (or are listed in
+        ``names``) are removed and their snapshotted files linked back into
+        place.  Other changed distributions (e.g., installed using
+        ``*.egg-info``) are left in place.
+
+        Returns
+        -------
+        list
+            Differences (i.e., ``freeze`` lines) between environment after
+            rollback and snapshot (empty if rollback was complete).
+        '''
+        from . import freeze, uninstall
+
+        with metrics.timer('transaction.rollback'):
+            before = _frozen_versions(self.frozen)
+            after = _frozen_versions(freeze())
+            changed = set(name_i for name_i in set(before) | set(after)
+                          if before.get(name_i) != after.get(name_i))
+            new = set(after) - set(before)
+            restore = (changed | set(self.names)) & set(self.files)
+            remove = sorted(new | (restore & set(after)))
+            for name_i in sorted(changed - new - restore):
+                logger.warning('Not restoring `%s` (not in snapshot).',
+                               name_i)
+            if remove:
+                uninstall(remove, capture_streams=False, native=True)
+            for name_i in restore:
+                for original_j, snapshot_j in self.files[name_i]:
+                    parent_j = os.path.dirname(original_j)
+                    if not os.path.isdir(parent_j):
+                        os.makedirs(parent_j)
+                    if os.path.lexists(original_j):
+                        os.remove(original_j)
+                    try:
+                        os.link(snapshot_j, original_j)
+                    except (AttributeError, OSError):
+                        shutil.copy2(snapshot_j, original_j)
+
+            restored = _frozen_versions(freeze())
+            differences = sorted(set(restored.values()) ^
+                                 set(before.values()))
+        logger.info('Rolled back %d package(s); removed %d new package(s).',
+                    len(restore), len(new))
+        if differences:
+            logger.warning('Environment differs from snapshot after '
+                           'rollback: %s', ', '.join(differences))
+        return differences
+
+    def discard(self):
+        '''
+        Remove snapshot files.
+        '''
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+            self.files = OrderedDict()
+
+
+@contextlib.contextmanager
+def transaction(names, mode='auto', dependencies=True):
+    '''
+    Context manager rolling back changes to packages if an error occurs.
+
+    See :class:`Snapshot` for parameters.
+    '''
+    snapshot = Snapshot(names, mode=mode, dependencies=dependencies).take()
+    try:
+        yield snapshot
+    except Exception:
+        logger.warning('Rolling back packages: %s', ', '.join(snapshot.names),
+                       exc_info=True)
+        try:
+            snapshot.rollback()
+        except Exception:
+            logger.error('Rollback failed; snapshot kept in `%s`.',
+                         snapshot.directory, exc_info=True)
+            raise
+        snapshot.discard()
+        raise
+    else:
+        snapshot.discard()
@@ -0,0 +1,212 @@
+'''
+Select the release file best suited to a target interpreter.
+
+The files of a release (as listed by the package index JSON API) are ranked
+by:
+
+ 1. compatible wheels, ordered by the priority of their best-matching
+    `compatibility tag`_ for the target interpreter;
+ 2. source distributions.
+
+Files which are not compatible with the target interpreter (i.e., wheels with
+no supported tag, other binary distributions, or files whose
+``requires_python`` excludes the target Python version) are not selected.
+
+.. _compatibility tag: https://www.python.org/dev/peps/pep-0425/
+'''
+import re
+import sys
+
+
+CRE_WHEEL_FILENAME = re.compile(r'''
+    ^(?P<name>.+?)-(?P<version>[^-]+?)(-(?P<build>\d[^-]*))?
+     -(?P<python>[^-]+)-(?P<abi>[^-]+)-(?P<platform>[^-]+)\.whl$''',
+                                re.VERBOSE)
+
+_default_tags = None
+
+
+def _specifier_set(specifiers):
+    try:
+        from packaging.specifiers import SpecifierSet
+    except ImportError:
+        try:
+            from pkg_resources.extern.packaging.specifiers import SpecifierSet
+        except ImportError:
+            from pip._vendor.packaging.specifiers import SpecifierSet
+    return SpecifierSet(specifiers)
+
+
+def supported_tags():
+    '''
+    Returns
+    -------
+    list
+        Compatibility tags supported by the running interpreter, as
+        ``(python, abi, platform)`` tuples in order of decreasing priority.
+    '''
+    global _default_tags
+
+    if _default_tags is None:
+        try:
+            from packaging.tags import sys_tags
+            tags = [(t.interpreter, t.abi, t.platform) for t in sys_tags()]
+        except ImportError:
+            try:
+                from pip.pep425tags import get_supported
+            except ImportError:
+                try:
+                    from pip._internal.pep425tags import get_supported
+                except ImportError:
+                    from pip._internal.utils.compatibility_tags import \
+                        get_supported
+            tags = [tuple(t) if isinstance(t, tuple)
+                    else (t.interpreter, t.abi, t.platform)
+                    for t in get_supported()]
+        _default_tags = tags
+    return _default_tags
+
+
+def wheel_tags(filename):
+    '''
+    Parameters
+    ----------
+    filename : str
+        Wheel filename (e.g., ``"foo-1.0-py2.py3-none-any.whl"``).
+
+    Returns
+    -------
+    list
+        ``(python, abi, platform)`` tuples of tags supported by wheel (i.e.,
+        with compressed tag sets expanded).
+
+    Raises
+    ------
+    ValueError
+        If ``filename`` is not a valid wheel filename.
+    '''
+    match = CRE_WHEEL_FILENAME.match(filename)
+    if not match:
+        raise ValueError('Invalid wheel filename: `{}`'.format(filename))
+    return [(python_i, abi_i, platform_i)
+            for python_i in match.group('python').split('.')
+            for abi_i in match.group('abi').split('.')
+            for platform_i in match.group('platform').split('.')]
+
+
+class Target(object):
+    '''
+    Interpreter to select release files for.
+
+    Parameters
+    ----------
+    tags : list, optional
+        Supported ``(python, abi, platform)`` tags in order of decreasing
+        priority (default: tags of the running interpreter).
+    python_version : str, optional
+        Python version checked against ``requires_python`` of each file
+        (default: version of the running interpreter).
+
+    Attributes
+    ----------
+    tags : list
+        Supported ``(python, abi, platform)`` tags in order of decreasing
+        priority.
+    python_version : str
+        Python version of target.
+    '''
+    def __init__(self, tags=None, python_version=None):
+        if tags is None:
+            tags = supported_tags()
+        if python_version is None:
+            python_version = '.'.join(map(str, sys.version_info[:3]))
+        self.tags = [tuple(tag_i) for tag_i in tags]
+        self.python_version = python_version
+        self._tag_ranks = {}
+        for i, tag_i in enumerate(self.tags):
+            self._tag_ranks.setdefault(tuple(tag_i), i)
+        self._requires_python = {}
+
+    def _python_compatible(self, requires_python):
+        if not requires_python:
+            return True
+        if requires_python not in self._requires_python:
+            try:
+                compatible = (self.python_version in
+                              _specifier_set(requires_python))
+            except ValueError:
+                # Invalid specifier; `pip` also ignores these.
+                compatible = True
+            self._requires_python[requires_python] = compatible
+        return self._requires_python[requires_python]
+
+    def rank(self, file_info):
+        '''
+        Parameters
+        ----------
+        file_info : dict
+            Release file information from the package index JSON API.
+
+        Returns
+        -------
+        tuple or None
+            Sort key (lower is better) or ``None`` if file is not compatible
+            with target.
+        '''
+        if not self._python_compatible(file_info.get('requires_python')):
+            return None
+        packagetype = file_info.get('packagetype')
+        if packagetype == 'bdist_wheel':
+            try:
+                ranks = [self._tag_ranks[tag_i] for tag_i in
+                         wheel_tags(file_info['filename'])
+                         if tag_i in self._tag_ranks]
+            except ValueError:
+                return None
+            return (0, min(ranks)) if ranks else None
+        elif packagetype == 'sdist':
+            return (1, 0)
+        return None
+
+    def select(self, files, wheels_only=False):
+        '''
+        Parameters
+        ----------
+        files : list
+            Release file information from the package index JSON API.
+        wheels_only : bool, optional
+            If ``True``, only consider wheels.
+
+        Returns
+        -------
+        dict or None
+            Best file for target, or ``None`` if no file is compatible.
+        '''
+        ranked = [(rank_i, i) for i, rank_i in enumerate(map(self.rank,
+                                                              files))
+                  if rank_i is not None and (not wheels_only or
+                                             rank_i[0] == 0)]
+        if not ranked:
+            return None
+        return files[min(ranked)[1]]
+
+    def is_python_compatible(self, file_info):
+        '''
+        Returns
+        -------
+        bool
+            ``True`` if ``requires_python`` of ``file_info`` (if any) includes
+            target Python version.
+        '''
+        return self._python_compatible(file_info.get('requires_python'))
+
+    def is_compatible_wheel(self, file_info):
+        '''
+        Returns
+        -------
+        bool
+            ``True`` if ``file_info`` describes a wheel compatible with
+            target.
+        '''
+        rank = self.rank(file_info)
+        return rank is not None and rank[0] == 0
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import pip_helpers as ph
+from pip_helpers import build
+from pip_helpers.wheels import supported_tags
+
+from .test_linking import _make_wheel
+
+
+SETUP_PY = '''
+from setuptools import setup
+
+setup(name={name!r}, version={version!r}, py_modules=[{name!r}])
+'''
+
+
+def _make_sdist(directory, name, version):
+    path = os.path.join(directory, '{}-{}.tar.gz'.format(name, version))
+    root = '{}-{}/'.format(name, version)
+    files = {'setup.py': SETUP_PY.format(name=name, version=version),
+             name + '.py': 'VERSION = {!r}\n'.format(version),
+             'PKG-INFO': 'Metadata-Version: 1.0\nName: {}\nVersion: {}\n'
+             .format(name, version)}
+    with tarfile.open(path, 'w:gz') as sdist:
+        for filename_i, content_i in files.items():
+            info_i = tarfile.TarInfo(root + filename_i)
+            info_i.size = len(content_i)
+            sdist.addfile(info_i, StringIO(content_i))
+    return path
+
+
+class TestPrebuild(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = os.path.join(self.directory, 'index')
+        self.download_dir = os.path.join(self.directory, 'download')
+        os.makedirs(self.index)
+        os.makedirs(self.download_dir)
+        _make_wheel(self.index, 'pip_helpers_test_top', '1.0',
+                    ['pip_helpers_test_dep'])
+        self.sdist = _make_sdist(self.index, 'pip_helpers_test_dep', '1.0')
+        self.options = ['--no-index', '--find-links', self.index]
+        self._run_command = ph._run_command
+
+    def tearDown(self):
+        ph._run_command = self._run_command
+        shutil.rmtree(self.directory)
+
+    def test_dependencies(self):
+        # Source-only dependency of a package with a wheel is built.
+        sdist_only = build.find_sdist_only(['pip_helpers_test_top'] +
+                                           self.options, self.download_dir)
+        self.assertEqual(sdist_only, [('pip_helpers_test_dep', '1.0',
+                                       os.path.join(self.download_dir,
+                                                    os.path.basename(
+                                                        self.sdist)))])
+
+    def test_requirements_file(self):
+        requirements = os.path.join(self.directory, 'requirements.txt')
+        with open(requirements, 'w') as output:
+            output.write('pip_helpers_test_top[extra]\n')
+        sdist_only = build.find_sdist_only(['-r', requirements] +
+                                           self.options, self.download_dir)
+        self.assertEqual([sdist_i[:2] for sdist_i in sdist_only],
+                         [('pip_helpers_test_dep', '1.0')])
+
+    def test_satisfied_skipped(self):
+        def _run_command(*args, **kwargs):
+            raise AssertionError('Unexpected `pip {}`'.format(args[0]))
+
+        ph._run_command = _run_command
+        self.assertEqual(build.find_sdist_only(['setuptools'] +
+                                               self.options,
+                                               self.download_dir), [])
+
+    def test_find_links(self):
+        cache_dir = os.path.join(self.directory, 'cache')
+
+        def _build(name, version, sdist_path, cache_dir):
+            return os.path.join(cache_dir, build.source_hash(sdist_path),
+                                '{}-{}-py2.py3-none-any.whl'
+                                .format(name, version))
+
+        original_build = build._build
+        build._build = _build
+        try:
+            packages = ['pip_helpers_test_top'] + self.options
+            arguments = build.prebuild(packages, cache_dir=cache_dir)
+        finally:
+            build._build = original_build
+        # Requested packages are passed to `pip install` unchanged.
+        # Wheels are cached per interpreter.
+        self.assertEqual(arguments, packages +
+                         ['--find-links',
+                          os.path.join(cache_dir,
+                                       '-'.join(supported_tags()[0]),
+                                       build.source_hash(self.sdist))])
+
+
+if __name__ == '__main__':
+    unittest.main()
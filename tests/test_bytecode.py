@@ -0,0 +1,64 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import pip_helpers as ph
+from pip_helpers.bytecode import cache_path, compile_distributions
+from pip_helpers.record import read_record, site_packages
+
+from .test_uninstall import _make_dist
+
+
+class TestCompile(unittest.TestCase):
+    def setUp(self):
+        # Install into a temporary environment.
+        self.prefix = tempfile.mkdtemp()
+        self._sys_prefix = sys.prefix
+        sys.prefix = self.prefix
+        self.site_packages_dir = site_packages()
+        os.makedirs(self.site_packages_dir)
+        self.dist_info = _make_dist(self.site_packages_dir, 'foo', '1.0',
+                                    ['foo/__init__.py', 'foo/bad.py'])
+        # Fails to compile (e.g., Python 3 only module).
+        with open(os.path.join(self.site_packages_dir, 'foo',
+                               'bad.py'), 'w') as output:
+            output.write('def (:\n')
+        self.source = os.path.join(self.site_packages_dir, 'foo',
+                                   '__init__.py')
+        self._run_command = ph._run_command
+
+    def tearDown(self):
+        sys.prefix = self._sys_prefix
+        ph._run_command = self._run_command
+        shutil.rmtree(self.prefix)
+
+    def _compiled_rows(self):
+        return [row[0] for row in read_record(self.dist_info)
+                if not row[0].endswith(('.py', 'METADATA', 'RECORD'))]
+
+    def test_compile_distributions(self):
+        relpath = (os.path.relpath(cache_path(self.source),
+                                   self.site_packages_dir)
+                   .replace(os.sep, '/'))
+        for i in range(2):
+            compiled = compile_distributions(['foo', 'missing'], jobs=2)
+            self.assertEqual(compiled, [self.source])
+            self.assertTrue(os.path.exists(cache_path(self.source)))
+            # Compiled files are added to `RECORD` (once).
+            self.assertEqual(self._compiled_rows(), [relpath])
+
+    def test_install(self):
+        def _run_command(*args, **kwargs):
+            self.assertIn('--no-compile', args)
+            return 'Successfully installed foo-1.0'
+
+        ph._run_command = _run_command
+        output = ph.install(['foo'], compile_jobs=1)
+        self.assertEqual(output, 'Successfully installed foo-1.0')
+        self.assertEqual(output.compiled, [self.source])
+
+
+if __name__ == '__main__':
+    unittest.main()
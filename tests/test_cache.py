@@ -0,0 +1,65 @@
+import unittest
+
+import pip_helpers as ph
+from pip_helpers.cache import MetadataCache
+from pip_helpers.store import ReleaseStore
+
+
+OTHER_SERVER_URL = 'https://index.example/pypi/{}/json'
+
+
+def _entry(version):
+    return {'package_data': {'info': {'name': 'foo'},
+                             'releases': {version: [{'filename':
+                                                     'foo-{}.tar.gz'
+                                                     .format(version),
+                                                     'packagetype':
+                                                     'sdist'}]}},
+            'public_releases': None}
+
+
+class TestIndexKeys(unittest.TestCase):
+    def _check(self, cache):
+        cache.put('foo', _entry('1.0'), index_url=ph.DEFAULT_SERVER_URL)
+        self.assertIsNone(cache.get('foo', index_url=OTHER_SERVER_URL))
+        name, releases = ph.get_releases('foo', include_hidden=True,
+                                         cache=cache)
+        self.assertEqual(list(releases), ['1.0'])
+
+    def test_memory(self):
+        cache = MetadataCache()
+        self._check(cache)
+        cache.put('foo', _entry('2.0'), index_url=OTHER_SERVER_URL)
+        name, releases = ph.get_releases('foo', include_hidden=True,
+                                         cache=cache,
+                                         server_url=OTHER_SERVER_URL)
+        self.assertEqual(list(releases), ['2.0'])
+        cache.invalidate(['foo'])
+        self.assertEqual(len(cache), 0)
+
+    def test_store(self):
+        store = ReleaseStore()
+        self._check(store)
+        # Entries of other indexes are not stored.
+        store.put('foo', _entry('2.0'), index_url=OTHER_SERVER_URL)
+        self.assertEqual(list(store.get('foo')['package_data']['releases']),
+                         ['1.0'])
+
+
+class TestTTL(unittest.TestCase):
+    def _check(self, cache):
+        cache.put('foo', _entry('1.0'), index_url=ph.DEFAULT_SERVER_URL)
+        self.assertIsNotNone(cache.get('foo',
+                                       index_url=ph.DEFAULT_SERVER_URL))
+        cache.ttl = -1
+        self.assertIsNone(cache.get('foo', index_url=ph.DEFAULT_SERVER_URL))
+
+    def test_memory(self):
+        self._check(MetadataCache(ttl=60))
+
+    def test_store(self):
+        self._check(ReleaseStore(ttl=60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import pip_helpers as ph
+from pip_helpers import daemon
+from pip_helpers.cache import MetadataCache
+from pip_helpers.wheels import Target
+
+
+class _Server(daemon.MetadataServer):
+    def do_missing(self):
+        raise KeyError('missing')
+
+    def do_fail(self):
+        raise IOError('failed')
+
+
+def _wheel(filename):
+    return {'filename': filename, 'packagetype': 'bdist_wheel',
+            'requires_python': None, 'url': 'https://files.example/' +
+            filename}
+
+
+@unittest.skipIf(not hasattr(socket, 'AF_UNIX'), 'Unix sockets required')
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'daemon.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _serve(self, cache=None):
+        server = _Server(self.path, cache=cache, threads=1)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def _stop():
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.addCleanup(_stop)
+        return server
+
+    def test_client_target(self):
+        releases = {'1.0': [_wheel('foo-1.0-py2-none-any.whl'),
+                            _wheel('foo-1.0-py3-none-any.whl')],
+                    '2.0': [_wheel('foo-2.0-py2-none-any.whl')]}
+        cache = MetadataCache()
+        cache.put('foo', {'package_data': {'info': {'name': 'foo'},
+                                           'releases': releases},
+                          'public_releases': None},
+                  index_url=ph.DEFAULT_SERVER_URL)
+        server = self._serve(cache)
+        max_results = daemon.MAX_RESULTS
+        daemon.MAX_RESULTS = 1
+        self.addCleanup(setattr, daemon, 'MAX_RESULTS', max_results)
+        for tag, expected in (('py2', ['foo-1.0-py2-none-any.whl',
+                                       'foo-2.0-py2-none-any.whl']),
+                              ('py3', ['foo-1.0-py3-none-any.whl'])):
+            # Files are selected for the client's target, not the daemon's
+            # interpreter.
+            target = Target(tags=[(tag, 'none', 'any')],
+                            python_version='3.6.0')
+            name, releases = daemon.get_releases(
+                'foo', path=self.path, include_hidden=True, wheels_only=True,
+                tags=target.tags, python_version=target.python_version)
+            self.assertEqual([release_i['filename'] for release_i in
+                              releases.values()], expected)
+        # Memoized results are bounded.
+        self.assertEqual(len(server._results), 1)
+
+    def test_errors(self):
+        self._serve()
+        self.assertRaises(KeyError, daemon.request, 'missing',
+                          path=self.path)
+        # Other errors are left for the client to reproduce locally.
+        self.assertRaises(daemon.DaemonUnavailable, daemon.request, 'fail',
+                          path=self.path)
+
+    def test_timeout(self):
+        # Socket which accepts connections but never answers.
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen(1)
+        try:
+            self.assertRaises(daemon.DaemonUnavailable, daemon.request,
+                              'ping', path=self.path, timeout=.1)
+        finally:
+            listener.close()
+
+    def test_request_timeout(self):
+        # Covers JSON and XML-RPC requests with all retries.
+        self.assertGreater(daemon.request_timeout(),
+                           2 * (ph.fetch.DEFAULT_RETRIES + 1) *
+                           sum(ph.fetch.DEFAULT_TIMEOUT))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import unittest
+
+import pip_helpers as ph
+from pip_helpers import fetch
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        fetch._breakers.clear()
+
+    def _open(self, url):
+        breaker = fetch.get_breaker(url)
+        breaker.reset_timeout = 0.01
+        for i in range(breaker.failure_threshold):
+            breaker.record_failure()
+        time.sleep(0.02)
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        return breaker
+
+    def test_non_retryable_trial_closes(self):
+        url = 'https://index.example/pypi/foo/json'
+        breaker = self._open(url)
+
+        def _missing():
+            raise KeyError('foo')
+
+        self.assertRaises(KeyError, fetch._call, url, _missing, 0, 0, 0)
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_retryable_trial_reopens(self):
+        url = 'https://index.example/pypi/foo/json'
+        breaker = self._open(url)
+
+        def _failing():
+            raise fetch._Retry(IOError('unreachable'))
+
+        self.assertRaises(IOError, fetch._call, url, _failing, 0, 0, 0)
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+
+class TestStale(unittest.TestCase):
+    def test_bounded(self):
+        fetch._stale.clear()
+        for i in range(fetch.MAX_STALE_RESPONSES + 10):
+            fetch._store_stale('https://index.example/{}'.format(i), i)
+        self.assertEqual(len(fetch._stale), fetch.MAX_STALE_RESPONSES)
+        self.assertNotIn('https://index.example/0', fetch._stale)
+
+    def test_get_releases(self):
+        # Default arguments query both the JSON and the XML-RPC API of the
+        # same host, so both must be served stale while its circuit is open.
+        fetch._stale.clear()
+        fetch._breakers.clear()
+        self.addCleanup(fetch._breakers.clear)
+        self.addCleanup(fetch._stale.clear)
+        fetch._store_stale(ph.DEFAULT_SERVER_URL.format('foo'),
+                           {'info': {'name': 'foo'},
+                            'releases': {'1.0': [{'filename':
+                                                  'foo-1.0.tar.gz',
+                                                  'packagetype': 'sdist'}],
+                                         '1.1': [{'filename':
+                                                  'foo-1.1.tar.gz',
+                                                  'packagetype': 'sdist'}]}})
+        breaker = fetch.get_breaker(ph.DEFAULT_HIDDEN_URL)
+        for i in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertRaises(fetch.CircuitOpenError, ph.get_releases, 'foo',
+                          use_daemon=False)
+
+        fetch._store_stale((ph.DEFAULT_HIDDEN_URL, 'package_releases',
+                            ('foo', )), ['1.0'])
+        name, releases = ph.get_releases('foo', use_daemon=False)
+        self.assertEqual(list(releases), ['1.0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+import pip_helpers as ph
+from pip_helpers.cache import MetadataCache
+from pip_helpers.wheels import Target
+
+
+def _file(filename, packagetype, requires_python=None):
+    return {'filename': filename, 'packagetype': packagetype,
+            'requires_python': requires_python,
+            'url': 'https://files.example/' + filename}
+
+
+class TestSelect(unittest.TestCase):
+    def setUp(self):
+        releases = {'1.0': [_file('foo-1.0.tar.gz', 'sdist')],
+                    '2.0': [_file('foo-2.0-cp36-cp36m-win32.whl',
+                                  'bdist_wheel')],
+                    '3.0': [_file('foo-3.0.tar.gz', 'sdist', '>=3.6')]}
+        self.cache = MetadataCache()
+        self.cache.put('foo', {'package_data': {'info': {'name': 'foo'},
+                                                'releases': releases},
+                               'public_releases': None},
+                       index_url=ph.DEFAULT_SERVER_URL)
+        self.target = Target(tags=[('py2', 'none', 'any')],
+                             python_version='2.7.18')
+
+    def _versions(self, **kwargs):
+        name, releases = ph.get_releases('foo', include_hidden=True,
+                                         cache=self.cache, target=self.target,
+                                         **kwargs)
+        return list(releases)
+
+    def test_requires_python_excluded(self):
+        # `3.0` requires Python 3.6; `2.0` only has a wheel for another
+        # platform (tag mismatch), so falls back to its first file.
+        self.assertEqual(self._versions(), ['1.0', '2.0'])
+
+    def test_wheels_only(self):
+        self.assertRaises(KeyError, self._versions, wheels_only=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+'''
+Regression test for import-time cost of :mod:`pip_helpers`.
+'''
+import subprocess as sp
+import sys
+import unittest
+
+
+#: Modules which are slow to import and must only be imported by the
+#: functions using them.
+LAZY_MODULES = ('pkg_resources', 'requests', 'natsort', 'xmlrpclib',
+                'xmlrpc.client', 'sqlite3', 'multiprocessing')
+
+
+class TestImport(unittest.TestCase):
+    def test_lazy_imports(self):
+        # Import in a fresh interpreter, since other tests may have imported
+        # the modules already.
+        code = ('import sys; import pip_helpers; '
+                'print(",".join(m for m in {!r} if m in sys.modules))'
+                .format(LAZY_MODULES))
+        output = sp.check_output([sys.executable, '-c', code])
+        imported = [module_i for module_i in
+                    output.decode('utf-8').strip().split(',') if module_i]
+        self.assertEqual(imported, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import pkg_resources
+
+import pip_helpers as ph
+import pip_helpers.linking
+from pip_helpers.linking import install_wheel, wheel_requires
+from pip_helpers.record import find_dist_info, install_scheme
+
+
+def _make_wheel(directory, name, version, requires=(), purelib=True):
+    path = os.path.join(directory, '{}-{}-py2.py3-none-any.whl'
+                        .format(name, version))
+    dist_info = '{}-{}.dist-info'.format(name, version)
+    metadata = ['Metadata-Version: 2.1', 'Name: ' + name,
+                'Version: ' + version]
+    metadata += ['Requires-Dist: ' + requirement_i
+                 for requirement_i in requires]
+    with zipfile.ZipFile(path, 'w') as wheel:
+        wheel.writestr(name + '.py', 'VERSION = {!r}\n'.format(version))
+        wheel.writestr(dist_info + '/METADATA', '\n'.join(metadata) + '\n')
+        wheel.writestr(dist_info + '/WHEEL', 'Wheel-Version: 1.0\n'
+                       'Root-Is-Purelib: {}\nTag: py2.py3-none-any\n'
+                       .format(str(purelib).lower()))
+        wheel.writestr(dist_info + '/RECORD', '')
+    return path
+
+
+class TestLinkInstall(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.setuptools = pkg_resources.get_distribution('setuptools')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_wheel_requires(self):
+        path = _make_wheel(self.directory, 'foo', '1.0',
+                           ['bar (>=1.0)', 'baz; extra == "qux"'])
+        self.assertEqual(wheel_requires(path),
+                         ['bar (>=1.0)', 'baz; extra == "qux"'])
+
+    def test_satisfied_skipped(self):
+        installed = _make_wheel(self.directory, 'setuptools',
+                                self.setuptools.version)
+        new = _make_wheel(self.directory, 'pip_helpers_test_new', '1.0',
+                          ['setuptools'])
+        unsatisfied = ph._unsatisfied_wheels([installed, new],
+                                             ['pip_helpers_test_new'])
+        self.assertEqual([path_i for path_i, dist_i in unsatisfied], [new])
+        unsatisfied = ph._unsatisfied_wheels([installed, new],
+                                             ['pip_helpers_test_new'],
+                                             upgrade=True)
+        self.assertEqual([path_i for path_i, dist_i in unsatisfied], [new])
+
+    def test_unsatisfied_dependency(self):
+        dependency = _make_wheel(self.directory, 'setuptools', '999.0')
+        new = _make_wheel(self.directory, 'pip_helpers_test_new', '1.0',
+                          ['setuptools>=999'])
+        unsatisfied = ph._unsatisfied_wheels([dependency, new],
+                                             ['pip_helpers_test_new'])
+        self.assertEqual([path_i for path_i, dist_i in unsatisfied],
+                         [dependency, new])
+        self.assertEqual(unsatisfied[0][1].project_name, 'setuptools')
+
+    def test_upgrade_top_level(self):
+        installed = _make_wheel(self.directory, 'setuptools',
+                                self.setuptools.version)
+        unsatisfied = ph._unsatisfied_wheels([installed], ['setuptools'],
+                                             upgrade=True)
+        self.assertEqual([path_i for path_i, dist_i in unsatisfied],
+                         [installed])
+
+    def test_replace_installed(self):
+        prefix = os.path.join(self.directory, 'env')
+        store = os.path.join(self.directory, 'store')
+        site_packages_dir = install_scheme(prefix)['purelib']
+        for version_i in ('1.0', '2.0'):
+            install_wheel(_make_wheel(self.directory, 'foo', version_i), store,
+                          prefix=prefix)
+        self.assertEqual(sorted(os.listdir(site_packages_dir)),
+                         ['foo-2.0.dist-info', 'foo.py'])
+
+    def test_platlib(self):
+        prefix = os.path.join(self.directory, 'env')
+        store = os.path.join(self.directory, 'store')
+        scheme = install_scheme(prefix)
+        # e.g., `lib64` on some distributions.
+        scheme['platlib'] = os.path.join(prefix, 'lib64', 'site-packages')
+        install_scheme_ = pip_helpers.linking.install_scheme
+        pip_helpers.linking.install_scheme = lambda prefix=None: dict(scheme)
+        try:
+            dist_info = install_wheel(_make_wheel(self.directory, 'foo', '1.0',
+                                                  purelib=False),
+                                      store, prefix=prefix)
+            self.assertEqual(os.path.dirname(dist_info), scheme['platlib'])
+            self.assertEqual(sorted(os.listdir(scheme['platlib'])),
+                             ['foo-1.0.dist-info', 'foo.py'])
+            self.assertEqual(find_dist_info('foo', [scheme['purelib'],
+                                                    scheme['platlib']]),
+                             dist_info)
+            # Installation in `platlib` is replaced.
+            install_wheel(_make_wheel(self.directory, 'foo', '2.0'), store,
+                          prefix=prefix)
+        finally:
+            pip_helpers.linking.install_scheme = install_scheme_
+        self.assertEqual(os.listdir(scheme['platlib']), [])
+        self.assertEqual(sorted(os.listdir(scheme['purelib'])),
+                         ['foo-2.0.dist-info', 'foo.py'])
+
+    def test_refuse_egg_info(self):
+        prefix = os.path.join(self.directory, 'env')
+        site_packages_dir = install_scheme(prefix)['purelib']
+        os.makedirs(os.path.join(site_packages_dir,
+                                 'foo-0.9-py2.7.egg-info'))
+        path = _make_wheel(self.directory, 'foo', '1.0')
+        self.assertRaises(RuntimeError, install_wheel, path,
+                          os.path.join(self.directory, 'store'),
+                          prefix=prefix)
+        self.assertFalse(os.path.exists(os.path.join(site_packages_dir,
+                                                     'foo.py')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import unittest
+
+from pip_helpers.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_increment(self):
+        self.registry.increment('fetch.bytes', 10)
+        self.registry.increment('fetch.bytes', 5)
+        self.registry.increment('run_command.exit', exit_code=1)
+        self.registry.increment('run_command.exit', exit_code=1)
+        self.registry.increment('run_command.exit', exit_code=0)
+        self.assertEqual(self.registry.snapshot()['counters'],
+                         [{'name': 'fetch.bytes', 'labels': {}, 'value': 15},
+                          {'name': 'run_command.exit',
+                           'labels': {'exit_code': '1'}, 'value': 2},
+                          {'name': 'run_command.exit',
+                           'labels': {'exit_code': '0'}, 'value': 1}])
+
+    def test_observe(self):
+        for seconds_i in (2., 1., 3.):
+            self.registry.observe('fetch', seconds_i)
+        self.assertEqual(self.registry.snapshot()['timers'],
+                         [{'name': 'fetch', 'labels': {}, 'count': 3,
+                           'sum': 6., 'min': 1., 'max': 3.}])
+        self.registry.reset()
+        self.assertEqual(self.registry.snapshot(),
+                         {'counters': [], 'timers': []})
+
+    def test_hooks(self):
+        events = []
+
+        def _fail(event):
+            raise RuntimeError('Hook failed.')
+
+        # A failing hook neither raises nor prevents other hooks and
+        # aggregation.
+        self.registry.add_hook(_fail)
+        self.registry.add_hook(events.append)
+        self.registry.increment('cache.hit', name_='foo')
+        with self.registry.timer('fetch'):
+            pass
+        self.assertEqual([(event_i['type'], event_i['name'],
+                           event_i['labels']) for event_i in events],
+                         [('counter', 'cache.hit', {'name_': 'foo'}),
+                          ('timer', 'fetch', {})])
+        self.assertEqual(events[0]['value'], 1)
+        self.registry.remove_hook(events.append)
+        self.registry.increment('cache.hit')
+        self.assertEqual(len(events), 2)
+        self.assertEqual(self.registry.snapshot()['counters'][-1]['value'],
+                         1)
+
+    def test_to_json(self):
+        self.registry.increment('fetch.bytes', 10, url='a')
+        self.registry.observe('fetch', 0.5)
+        self.assertEqual(json.loads(self.registry.to_json()),
+                         {'counters': [{'name': 'fetch.bytes',
+                                        'labels': {'url': 'a'},
+                                        'value': 10}],
+                          'timers': [{'name': 'fetch', 'labels': {},
+                                      'count': 1, 'sum': 0.5, 'min': 0.5,
+                                      'max': 0.5}]})
+
+    def test_to_prometheus(self):
+        self.registry.increment('fetch.bytes', 10)
+        self.registry.increment('fetch.bytes', 2, url='a"b\\c\nd')
+        self.registry.observe('get-releases.fetch', 0.5, cached=False)
+        self.assertEqual(
+            self.registry.to_prometheus(),
+            '# TYPE pip_helpers_fetch_bytes_total counter\n'
+            'pip_helpers_fetch_bytes_total 10\n'
+            'pip_helpers_fetch_bytes_total{url="a\\"b\\\\c\\nd"} 2\n'
+            '# TYPE pip_helpers_get_releases_fetch_seconds_count counter\n'
+            'pip_helpers_get_releases_fetch_seconds_count{cached="False"} 1\n'
+            '# TYPE pip_helpers_get_releases_fetch_seconds_sum counter\n'
+            'pip_helpers_get_releases_fetch_seconds_sum{cached="False"} 0.5\n'
+            '# TYPE pip_helpers_get_releases_fetch_seconds_min gauge\n'
+            'pip_helpers_get_releases_fetch_seconds_min{cached="False"} 0.5\n'
+            '# TYPE pip_helpers_get_releases_fetch_seconds_max gauge\n'
+            'pip_helpers_get_releases_fetch_seconds_max{cached="False"} 0.5\n')
+        self.assertEqual(self.registry.to_prometheus(prefix=''),
+                         self.registry.to_prometheus()
+                         .replace('pip_helpers_', ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import pip_helpers as ph
+from pip_helpers import profiling
+
+
+class TestProfile(unittest.TestCase):
+    def test_phase_times(self):
+        times = profiling.phase_times([(1., 'Collecting foo'),
+                                       (3., 'Installing collected packages: '
+                                        'foo')], 4.)
+        self.assertEqual(times, dict(startup=1., resolve=2., download=0.,
+                                     build=0., install=1.))
+
+    def test_failure(self):
+        # Timings and profile of failed run are attached to the exception.
+        with self.assertRaises(RuntimeError) as context:
+            ph._run_command('no-such-command', profile=True,
+                            ostream=StringIO())
+        output = context.exception.output
+        try:
+            self.assertIsInstance(output, profiling.ProfiledOutput)
+            self.assertEqual(list(output.phases), list(profiling.PHASES))
+            self.assertTrue(os.path.exists(output.profile_path))
+        finally:
+            os.remove(output.profile_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
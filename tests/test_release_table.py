@@ -0,0 +1,55 @@
+import unittest
+
+from pip_helpers.release_table import ReleaseTable, is_pre
+
+
+class TestReleaseTable(unittest.TestCase):
+    def setUp(self):
+        versions = ['1.0', '2.0rc1', '2.0b1', '1.5a2', '1.1.dev0', '1.1']
+        self.table = ReleaseTable.from_items((v, {}) for v in versions)
+
+    def test_is_pre(self):
+        for version_i in ('2.0rc1', '2.0b1', '1.5a2', '1.1.dev0', '1.0.pre1'):
+            self.assertTrue(is_pre(version_i), version_i)
+        for version_i in ('1.0', '1.0.post1'):
+            self.assertFalse(is_pre(version_i), version_i)
+
+    def test_latest(self):
+        self.assertEqual(self.table.latest_stable, '1.1')
+        self.assertEqual(self.table.latest_pre, '2.0rc1')
+        self.assertEqual(self.table.latest(2), ['1.0', '1.1'])
+        self.assertEqual(self.table.latest_matching(pre=True), '2.0rc1')
+
+    def test_less_than_excludes_pre_releases(self):
+        self.assertEqual(self.table.latest_matching('<2.0', pre=True), '1.5a2')
+        self.assertEqual(self.table.range('<2.0', pre=True),
+                         ['1.0', '1.1.dev0', '1.1', '1.5a2'])
+        self.assertEqual(self.table.range('<2.0rc1', pre=True),
+                         ['1.0', '1.1.dev0', '1.1', '1.5a2', '2.0b1'])
+        self.assertEqual(self.table.range('>=1.1,<2.0', pre=False),
+                         ['1.1'])
+
+    def test_greater_than_excludes_post_releases(self):
+        table = ReleaseTable.from_items((v, {}) for v in
+                                        ['1.4', '1.4.post1', '1.4.post2',
+                                         '1.4.1', '1.5'])
+        self.assertEqual(table.range('>1.4'), ['1.4.1', '1.5'])
+        self.assertEqual(table.range('>1.4.post1'), ['1.4.post2', '1.4.1',
+                                                     '1.5'])
+        self.assertEqual(table.range('>=1.4'), list(table))
+
+    def test_wildcard(self):
+        table = ReleaseTable.from_items((v, {}) for v in
+                                        ['1.3', '1.4.dev0', '1.4a1', '1.4',
+                                         '1.4.2', '1.4.post1', '1.5.dev0',
+                                         '1.5'])
+        self.assertEqual(table.range('==1.4.*'), ['1.4.dev0', '1.4a1', '1.4',
+                                                  '1.4.post1', '1.4.2'])
+        self.assertEqual(table.range('!=1.4.*'), ['1.3', '1.5.dev0', '1.5'])
+        self.assertEqual(table.latest_matching('>=1.0,!=1.5.*'), '1.4.2')
+        for specifiers_i in ('<1.4.*', '>=1.4.*', '>1.4.*'):
+            self.assertRaises(ValueError, table.range, specifiers_i)
+
+
+if __name__ == '__main__':
+    unittest.main()
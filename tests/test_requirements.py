@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pip_helpers as ph
+from pip_helpers import requirements
+from pip_helpers.requirements import parse_line
+
+
+def _descriptor(line):
+    return parse_line(line)[1].descriptor
+
+
+class TestDescriptor(unittest.TestCase):
+    def test_compatible_release(self):
+        self.assertEqual(_descriptor('foo[bar]~=1.4.2'), 'foo>=1.4.2,<1.5')
+        # Only the release segment is truncated.
+        self.assertEqual(_descriptor('foo~=1.4.post1'), 'foo>=1.4.post1,<2')
+        self.assertEqual(_descriptor('foo~=2.0rc1'), 'foo>=2.0rc1,<3')
+
+    def test_wildcard(self):
+        self.assertEqual(_descriptor('star==1.4.*'),
+                         'star>=1.4.dev0,<1.5.dev0')
+        self.assertEqual(_descriptor('star!=1.4.*,>=1.0'),
+                         'star!=1.4.*,>=1.0')
+
+    def test_accepted(self):
+        for line_i in ('star==1.4.*', 'star!=1.4.*,>=1.0', 'foo~=1.4.post1',
+                       'foo===1.0'):
+            descriptor_i = _descriptor(line_i)
+            self.assertTrue(ph.CRE_PACKAGE.match(descriptor_i), descriptor_i)
+
+
+def _write(directory, filename, lines):
+    path = os.path.join(directory, filename)
+    with open(path, 'w') as output:
+        output.write('\n'.join(lines) + '\n')
+    return path
+
+
+class TestRequirementsFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        requirements.clear_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        requirements.clear_cache()
+
+    def test_includes(self):
+        path = _write(self.directory, 'requirements.txt',
+                      ['foo>=1.0  # comment', '-r other.txt',
+                       '--constraint constraints.txt'])
+        _write(self.directory, 'other.txt',
+               ['bar[x,y] ~= 2.0 ; python_version >= "2"',
+                'baz ; python_version < "1"', '--index-url https://x/'])
+        _write(self.directory, 'constraints.txt', ['foo<2.0', 'qux==1.0'])
+        parsed = [(r.name, r.constraint, os.path.basename(r.path))
+                  for r in requirements.iter_requirements(path)]
+        # `baz` marker does not apply; options are skipped.
+        self.assertEqual(parsed, [('foo', False, 'requirements.txt'),
+                                  ('bar', False, 'other.txt'),
+                                  ('foo', True, 'constraints.txt'),
+                                  ('qux', True, 'constraints.txt')])
+        self.assertEqual(len(list(requirements
+                                  .iter_requirements(path, evaluate=False))),
+                         5)
+
+        loaded = requirements.load_requirements(path)
+        # Constraints are merged; constrained-only packages are not listed.
+        self.assertEqual(list(loaded), ['foo', 'bar'])
+        self.assertEqual(loaded['foo'].specifiers, [('>=', '1.0'),
+                                                    ('<', '2.0')])
+        self.assertEqual(loaded['bar'].extras, ('x', 'y'))
+        self.assertEqual(str(loaded['foo']), 'foo>=1.0,<2.0')
+
+    def test_recursive_include(self):
+        path = _write(self.directory, 'a.txt', ['-r b.txt'])
+        _write(self.directory, 'b.txt', ['-r a.txt'])
+        self.assertRaises(ValueError, list,
+                          requirements.iter_requirements(path))
+
+    def test_marker_cache(self):
+        marker = 'python_version >= "2"'
+        self.assertTrue(requirements.evaluate_marker(marker))
+        self.assertIn(marker, requirements._MARKERS)
+        # Each distinct marker is only evaluated once.
+        requirements._MARKERS[marker] = False
+        self.assertFalse(requirements.evaluate_marker(marker))
+        self.assertRaises(ValueError, requirements.evaluate_marker,
+                          'python_version >>> "2"')
+
+    def test_parse_cache(self):
+        path = _write(self.directory, 'a.txt', ['foo==1.0'])
+        copy = _write(self.directory, 'b.txt', ['foo==1.0'])
+        parsed = requirements._parse_file(path)
+        # Cached by hash of contents, regardless of path.
+        self.assertIs(requirements._parse_file(copy), parsed)
+        self.assertEqual([r.path for r in
+                          requirements.iter_requirements(copy)], [copy])
+        _write(self.directory, 'a.txt', ['foo==2.0'])
+        self.assertEqual(requirements._parse_file(path)[0][1].specifiers,
+                         [('==', '2.0')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import datetime as dt
+import unittest
+
+from pip_helpers.store import ReleaseStore
+
+
+def _file(name, version, upload_time):
+    return {'filename': '{}-{}.tar.gz'.format(name, version),
+            'packagetype': 'sdist', 'upload_time': upload_time}
+
+
+def _entry(name, releases):
+    return {'package_data': {'info': {'name': name},
+                             'releases': dict((version, [_file(name, version,
+                                                               time)]
+                                               if time else [])
+                                              for version, time in
+                                              releases.items())},
+            'public_releases': None}
+
+
+class TestQueries(unittest.TestCase):
+    def setUp(self):
+        recent = ((dt.datetime.utcnow() - dt.timedelta(days=1))
+                  .strftime('%Y-%m-%dT%H:%M:%S'))
+        self.recent = recent
+        self.store = ReleaseStore()
+        self.store.put('foo', _entry('foo', {'1.0': '2000-01-01T00:00:00',
+                                             '1.1rc1': recent,
+                                             # Release without files.
+                                             '1.5': None}))
+        self.store.put('Bar_Baz', _entry('Bar_Baz',
+                                         {'2.0': '2001-01-01T00:00:00'}))
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_latest_versions(self):
+        self.assertEqual(self.store.latest_versions(['foo', 'bar-baz',
+                                                     'missing']),
+                         {'foo': '1.0', 'bar-baz': '2.0', 'missing': None})
+        self.assertEqual(self.store.latest_versions(['foo'], pre=True),
+                         {'foo': '1.1rc1'})
+
+    def test_released_since(self):
+        self.assertEqual(self.store.released_since(7),
+                         [('foo', '1.1rc1', self.recent)])
+        self.assertEqual(self.store.released_since(7, pre=False), [])
+        self.assertEqual([row[:2] for row in
+                          self.store.released_since(365 * 100)],
+                         [('foo', '1.0'), ('Bar_Baz', '2.0'),
+                          ('foo', '1.1rc1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
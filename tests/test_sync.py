@@ -0,0 +1,55 @@
+import unittest
+
+from pip_helpers import fetch
+from pip_helpers.cache import MetadataCache
+from pip_helpers.sync import MetadataSync
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.changes = []
+        self.call_xmlrpc = fetch.call_xmlrpc
+
+        def _call_xmlrpc(url, method, args=(), **kwargs):
+            self.calls.append((method, args))
+            if method == 'changelog_last_serial':
+                return 100
+            return self.changes
+
+        fetch.call_xmlrpc = _call_xmlrpc
+        self.cache = MetadataCache()
+        self.cache.put('foo', {'package_data': {}, 'public_releases': None})
+        self.cache.put('bar', {'package_data': {}, 'public_releases': None})
+
+    def tearDown(self):
+        fetch.call_xmlrpc = self.call_xmlrpc
+
+    def test_bootstrap(self):
+        # Without a serial, it is unknown which entries are current.
+        sync = MetadataSync(self.cache)
+        self.assertEqual(sync.sync(), [])
+        self.assertEqual(self.calls, [('changelog_last_serial', ())])
+        self.assertEqual(self.cache.serial, 100)
+        self.assertEqual(len(self.cache), 0)
+        self.assertIsNotNone(sync.last_sync)
+
+    def test_invalidate(self):
+        self.cache.serial = 100
+        self.changes = [['Foo', '1.1', 0, 'new release', 105],
+                        ['baz', '1.0', 0, 'new release', 103],
+                        ['Foo', '1.1', 0, 'add source file', 104]]
+        self.assertEqual(MetadataSync(self.cache).sync(), ['Foo', 'baz'])
+        self.assertEqual(self.calls, [('changelog_since_serial', (100, ))])
+        self.assertIsNone(self.cache.get('foo'))
+        self.assertIsNotNone(self.cache.get('bar'))
+        # Serial advances to the latest change.
+        self.assertEqual(self.cache.serial, 105)
+
+        self.changes = []
+        self.assertEqual(MetadataSync(self.cache).sync(), [])
+        self.assertEqual(self.cache.serial, 105)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import pip_helpers as ph
+from pip_helpers.linking import install_wheel
+from pip_helpers.record import site_packages
+from pip_helpers.transaction import transaction
+
+from .test_linking import _make_wheel
+
+
+class TestRollback(unittest.TestCase):
+    def setUp(self):
+        # Install into a temporary environment.
+        self.prefix = tempfile.mkdtemp()
+        self.wheels = tempfile.mkdtemp()
+        self.store = os.path.join(self.wheels, 'store')
+        self._sys_prefix = sys.prefix
+        sys.prefix = self.prefix
+        self.site_packages_dir = site_packages()
+        os.makedirs(self.site_packages_dir)
+        self._run_command = ph._run_command
+
+        def _run_command(command, *args, **kwargs):
+            if command == 'install':
+                return self._pip_install(*args)
+            assert command == 'freeze'
+            return '\n'.join(self._freeze())
+
+        ph._run_command = _run_command
+
+    def tearDown(self):
+        sys.prefix = self._sys_prefix
+        ph._run_command = self._run_command
+        shutil.rmtree(self.prefix)
+        shutil.rmtree(self.wheels)
+
+    def _freeze(self):
+        return sorted('{}=={}'.format(*entry_i[:-len('.dist-info')]
+                                      .rsplit('-', 1))
+                      for entry_i in os.listdir(self.site_packages_dir)
+                      if entry_i.endswith('.dist-info'))
+
+    def _install(self, name, version, requires=()):
+        install_wheel(_make_wheel(self.wheels, name, version, requires),
+                      self.store)
+
+    def _module_version(self, name):
+        with open(os.path.join(self.site_packages_dir,
+                               name + '.py')) as input_:
+            return input_.read()
+
+    def test_dependency_upgrade(self):
+        self._install('dep', '1.0')
+        self._install('app', '1.0', ['dep>=1.0'])
+        self._install('other', '1.0')
+        with self.assertRaises(RuntimeError):
+            with transaction(['app']):
+                # Upgrade changes dependency, unrelated package and adds a
+                # new package, then fails.
+                self._install('dep', '2.0')
+                self._install('new', '1.0')
+                self._install('other', '2.0')
+                self._install('app', '2.0', ['dep>=2.0', 'new'])
+                raise RuntimeError('Install failed.')
+        # `app` and its dependency are restored and `new` is removed;
+        # `other` (not in snapshot) is left in place.
+        self.assertEqual(self._freeze(), ['app==1.0', 'dep==1.0',
+                                          'other==2.0'])
+        self.assertEqual(self._module_version('dep'), "VERSION = '1.0'\n")
+        self.assertFalse(os.path.exists(os.path.join(self.site_packages_dir,
+                                                     'new.py')))
+        self.assertEqual([entry_i for entry_i in
+                          os.listdir(self.site_packages_dir)
+                          if entry_i.startswith('.pip_helpers-snapshot')],
+                         [])
+
+    def test_install_arguments(self):
+        self._install('app', '1.0')
+        self._install('other', '1.0')
+        requirements = os.path.join(self.wheels, 'requirements.txt')
+        with open(requirements, 'w') as output:
+            output.write('other>=1.0\n')
+
+        def _pip_install(*args):
+            self._install('app', '2.0')
+            self._install('other', '2.0')
+            raise RuntimeError('Install failed.')
+
+        self._pip_install = _pip_install
+        # Requirements with extras or `~=`, and of requirements files, are
+        # snapshotted.
+        self.assertRaises(RuntimeError, ph.install,
+                          ['app[extra]~=1.0', '-r', requirements, '-U'],
+                          capture_streams=False, transactional=True)
+        self.assertEqual(self._freeze(), ['app==1.0', 'other==1.0'])
+
+    def test_iter_arguments(self):
+        requirements = os.path.join(self.wheels, 'requirements.txt')
+        with open(requirements, 'w') as output:
+            output.write('foo\nbar[x]==1.0\n')
+        self.assertEqual(list(ph._iter_arguments(
+            ['baz[x]>=1.0', '-r', requirements, '-c', 'constraints.txt',
+             '--requirement={}'.format(requirements), '-U',
+             './qux-1.0.tar.gz'])),
+            [(['baz[x]>=1.0'], ['baz']),
+             (['-r', requirements], ['foo', 'bar']),
+             (['-c', 'constraints.txt'], []),
+             (['--requirement={}'.format(requirements)], ['foo', 'bar']),
+             (['-U'], []), (['./qux-1.0.tar.gz'], [])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import pip_helpers as ph
+from pip_helpers.record import site_packages, write_record
+
+
+def _make_dist(site_packages_dir, name, version, files):
+    dist_info = os.path.join(site_packages_dir,
+                             '{}-{}.dist-info'.format(name, version))
+    os.makedirs(dist_info)
+    rows = []
+    for relpath_i in files:
+        path_i = os.path.join(site_packages_dir, relpath_i)
+        if not os.path.isdir(os.path.dirname(path_i)):
+            os.makedirs(os.path.dirname(path_i))
+        with open(path_i, 'w') as output:
+            output.write('# {}\n'.format(relpath_i))
+        rows.append((relpath_i, '', ''))
+    with open(os.path.join(dist_info, 'METADATA'), 'w') as output:
+        output.write('Name: {}\nVersion: {}\n'.format(name, version))
+    rows.append((os.path.relpath(os.path.join(dist_info, 'METADATA'),
+                                 site_packages_dir), '', ''))
+    write_record(dist_info, rows)
+    return dist_info
+
+
+class TestNativeUninstall(unittest.TestCase):
+    def setUp(self):
+        # Uninstall from a temporary environment.
+        self.prefix = tempfile.mkdtemp()
+        self._sys_prefix = sys.prefix
+        sys.prefix = self.prefix
+        self.site_packages_dir = site_packages()
+        os.makedirs(self.site_packages_dir)
+        self.commands = []
+        self._run_command = ph._run_command
+
+        def _run_command(*args, **kwargs):
+            self.commands.append(args)
+            return 'Successfully uninstalled egg-0.1'
+
+        ph._run_command = _run_command
+
+    def tearDown(self):
+        sys.prefix = self._sys_prefix
+        ph._run_command = self._run_command
+        shutil.rmtree(self.prefix)
+
+    def test_uninstall(self):
+        _make_dist(self.site_packages_dir, 'foo', '1.0',
+                   ['foo/__init__.py', 'foo/bar.py'])
+        _make_dist(self.site_packages_dir, 'baz', '2.0', ['baz.py'])
+        output = ph.uninstall(['foo', 'baz', 'egg'], native=True, jobs=2)
+        self.assertEqual(os.listdir(self.site_packages_dir), [])
+        self.assertEqual(self.commands, [('uninstall', '-y', 'egg')])
+        self.assertIn('Successfully uninstalled foo-1.0', output)
+        self.assertIn('Successfully uninstalled baz-2.0', output)
+
+    def test_partial(self):
+        _make_dist(self.site_packages_dir, 'foo', '1.0',
+                   ['foo/__init__.py', 'foo/sub'])
+        _make_dist(self.site_packages_dir, 'baz', '2.0', ['baz.py'])
+        # A directory listed as a file cannot be removed.
+        sub = os.path.join(self.site_packages_dir, 'foo', 'sub')
+        os.remove(sub)
+        os.makedirs(os.path.join(sub, 'data'))
+        with self.assertRaises(RuntimeError) as context:
+            ph.uninstall(['foo', 'baz', 'egg'], native=True)
+        message = str(context.exception)
+        self.assertIn('Partially uninstalled foo-1.0', message)
+        self.assertIn(sub, message)
+        self.assertIn('Successfully uninstalled baz-2.0', message)
+        # Other packages are uninstalled before raising.
+        self.assertEqual(self.commands, [('uninstall', '-y', 'egg')])
+        self.assertEqual(os.listdir(self.site_packages_dir), ['foo'])
+
+
+if __name__ == '__main__':
+    unittest.main()